@@ -14,17 +14,31 @@ Daniel Ariad (daniel@ariad.org)
 Sep 1, 2020
 """
 
-import collections, time, pickle, argparse, re, sys, random, os, bz2, gzip, platform
+import collections, time, pickle, argparse, re, sys, random, os, bz2, gzip, io, platform
 from HOMOGENOUES_MODELS import homogeneous
 from RECENT_ADMIXTURE_MODELS import recent_admixture
 from DISTANT_ADMIXTURE_MODELS import distant_admixture
 
 
-from itertools import product
+from itertools import product, starmap
 from functools import reduce
 from operator import and_, itemgetter, attrgetter
-from statistics import mean, variance, pstdev
-from math import comb, log
+from statistics import mean
+from math import comb, log, fsum
+
+OPENERS = {'bz2': bz2.open, 'gz': gzip.open} ### Opening methods according to the file extension.
+
+try:
+    import lz4.frame
+    OPENERS['lz4'] = lz4.frame.open
+except ModuleNotFoundError:
+    print('Caution: The module lz4 is missing. Files compressed via lz4 would not be supported.')
+
+try:
+    import zstandard
+    OPENERS['zst'] = zstandard.open
+except ModuleNotFoundError:
+    print('Caution: The module zstandard is missing. Files compressed via zstd would not be supported.')
 
 leg_tuple = collections.namedtuple('leg_tuple', ('chr_id', 'pos', 'ref', 'alt')) #Encodes the rows of the legend table
 obs_tuple = collections.namedtuple('obs_tuple', ('pos', 'read_id', 'base')) #Encodes the rows of the observations table
@@ -49,17 +63,19 @@ class popcount_lk:
         return sum(x.to_bytes((x.bit_length()>>3)+1,self.byteorder).translate(self.lookup_table))
 
 def mean_and_var(x):
-    """ Calculates the mean and variance. """
+    """ Calculates the mean and variance. The sums are accumulated by
+    math.fsum, which is exact up to the final rounding, rather than via the
+    fractions of the module statistics. """
     cache = tuple(x)
-    m = mean(cache)
-    var = variance(cache, xbar=m)
+    m = fsum(cache) / len(cache)
+    var = fsum((i - m)**2 for i in cache) / (len(cache) - 1)
     return m, var
 
 def mean_and_std(x):
     """ Calculates the mean and population standard deviation. """
     cache = tuple(x)
-    m = mean(cache)
-    std = pstdev(cache, mu=m)
+    m = fsum(cache) / len(cache)
+    std = (fsum((i - m)**2 for i in cache) / len(cache))**.5
     return m, std
 
 def mean_and_std_of_mean_of_rnd_var(A):
@@ -77,17 +93,15 @@ def mean_and_std_of_mean_of_rnd_var(A):
 
 def LLR(y,x):
     """ Calculates the logarithm of y over x and deals with edge cases. """
+    ### The cases are exclusive, thus each edge case tests a single condition and the function returns at once.
     if x and y:
-        result = log(y/x)
-    elif x and not y:
-        result = -1.23456789
-    elif not x and y:
-        result = +1.23456789
-    elif not x and not y:
-        result = 0
+        return log(y/x)
+    elif x:
+        return -1.23456789
+    elif y:
+        return +1.23456789
     else:
-        result = None
-    return result
+        return 0
 
 def invert(x,n):
     """ Inverts the bits of a positive integer. """
@@ -297,10 +311,12 @@ def statistics(likelihoods,genomic_windows):
 
         pairs = (('BPH','SPH'), ('disomy','monosomy'), ('BPH','disomy'), ('disomy','SPH'), ('SPH','monosomy'));
 
-        LLRs = {(i,j):
-                {window: tuple(LLR(attrgetter(i)(l), attrgetter(j)(l)) for l in likelihoods_in_window)
+        getters = {pair: attrgetter(*pair) for pair in pairs}
+
+        LLRs = {pair:
+                {window: tuple(starmap(LLR, map(getters[pair], likelihoods_in_window)))
                            for window,likelihoods_in_window in likelihoods.items()}
-                                                            for i,j in pairs}
+                                                            for pair in pairs}
 
         LLRs_per_genomic_window = {pair:
                 {window: mean_and_var(LLRs_in_window) for window, LLRs_in_window in LLRs[pair].items()}
@@ -342,14 +358,22 @@ def print_summary(obs_filename,info):
             print(f"Mean LLR: {L['mean_of_mean']:.3f}, Standard error of the mean LLR: {L['std_of_mean']:.3f}")
             print(f"Fraction of genomic windows with a negative LLR: {L['fraction_of_negative_LLRs']:.3f}")
 
+def open_for_reading(filename):
+    """ Opens a file for reading, according to its extension. The stream of a
+        compressed file is wrapped by a buffer of 1 MiB, such that the many
+        small reads of the unpickler do not refill the decompressor. """
+    ext = filename.rsplit('.',1)[-1]
+    return io.BufferedReader(OPENERS[ext](filename, 'rb'), buffer_size=1<<20) if ext in OPENERS else open(filename, 'rb')
+
 def save_results(likelihoods,info,compress,obs_filename,output_filename,output_dir):
     """ Saves the likelihoods together with information about the chromosome
         number, depth of coverage, ancestry, statistics of the genomic windows
-        and flags that were used. Also, data compression is supported in gzip
-        and bzip2 formats. """
+        and flags that were used. Also, data compression is supported in gzip,
+        bzip2, lz4 and zstd formats. """
 
-    Open = {'bz2': bz2.open, 'gz': gzip.open}.get(compress, open)
-    ext = ('.'+compress) * (compress in ('bz2','gz'))
+    assert compress=='unc' or compress in OPENERS, f'The module that is required for {compress} compression is missing.'
+    Open = OPENERS.get(compress, open)
+    ext = ('.'+compress) * (compress in OPENERS)
     obs_filename_stripped =  obs_filename.rsplit('/', 1).pop()
     default_output_filename = re.sub('(.*)obs.p(.*)',f'\\1LLR.p{ext:s}', obs_filename_stripped, 1)
     if output_filename=='':
@@ -379,24 +403,18 @@ def aneuploidy_test(obs_filename,leg_filename,hap_filename,
     path = os.path.realpath(__file__).rsplit('/', 1)[0] + '/MODELS/'
     models_filename = kwargs.get('model', path + ('MODELS18.p' if max_reads>16 else ('MODELS16.p' if max_reads>12 else 'MODELS12.p')))
 
-    load = lambda filename: {'bz2': bz2.open, 'gz': gzip.open}.get(filename.rsplit('.',1)[1], open)  #Adjusts the opening method according to the file extension.
-
-    open_obs = load(obs_filename)
-    with open_obs(obs_filename, 'rb') as obs_in:
+    with open_for_reading(obs_filename) as obs_in:
         obs_tab = pickle.load(obs_in)
         info = pickle.load(obs_in)
 
-    open_hap = load(hap_filename)
-    with open_hap(hap_filename,'rb') as hap_in:
+    with open_for_reading(hap_filename) as hap_in:
         hap_tab = pickle.load(hap_in)
         number_of_haplotypes = pickle.load(hap_in)
 
-    open_leg = load(leg_filename)
-    with open_leg(leg_filename,'rb') as leg_in:
+    with open_for_reading(leg_filename) as leg_in:
         leg_tab = pickle.load(leg_in)
 
-    open_model = load(models_filename)
-    with open_model(models_filename, 'rb') as model_in:
+    with open_for_reading(models_filename) as model_in:
         models_dict = pickle.load(model_in)
 
     ancestry = set(ancestral_makeup.keys()) if type(ancestral_makeup)==dict else set(ancestral_makeup)
@@ -476,8 +494,8 @@ if __name__ == "__main__":
                         help='Consider only reads that reach the minimal score. The default value is 2.')
     parser.add_argument('-O', '--output-filename', type=str, metavar='output_filename',  default='',
                         help='The output filename. The default is the input filename with the extension \".obs.p\" replaced by \".LLR.p\".')
-    parser.add_argument('-C', '--compress', metavar='gz/bz2/unc', type=str, default='unc',  choices=['gz','bz2','unc'],
-                        help='Output compressed via gzip, bzip2 or uncompressed. Default is uncompressed.')
+    parser.add_argument('-C', '--compress', metavar='gz/bz2/lz4/zst/unc', type=str, default='unc',  choices=['gz','bz2','lz4','zst','unc'],
+                        help='Output compressed via gzip, bzip2, lz4, zstd or uncompressed. Default is uncompressed.')
     args = vars(parser.parse_args())
 
     strings_even = all(i.isalnum() for i in args['ancestral_makeup'][0::2])
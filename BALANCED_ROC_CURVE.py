@@ -22,60 +22,137 @@ Daniel Ariad (daniel@ariad.org)
 Dec 30, 2021
 """
 
-import pickle, bz2, gzip, sys, os, argparse
-from math import log
-from operator import attrgetter
+import pickle, bz2, gzip, io, sys, os, re, argparse, hashlib
+import numpy as np
+from functools import partial
+from itertools import chain
 from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+OPENERS = {'bz2': bz2.open, 'gz': gzip.open, 'gzip': gzip.open} ### Opening methods according to the file extension.
+
+try:
+    import lz4.frame
+    OPENERS['lz4'] = lz4.frame.open
+except ModuleNotFoundError:
+    print('Caution: The module lz4 is missing. Files compressed via lz4 would not be supported.')
+
+try:
+    import zstandard
+    OPENERS['zst'] = zstandard.open
+except ModuleNotFoundError:
+    print('Caution: The module zstandard is missing. Files compressed via zstd would not be supported.')
 
 leg_tuple = namedtuple('leg_tuple', ('chr_id', 'pos', 'ref', 'alt')) #Encodes the rows of the legend table
 sam_tuple = namedtuple('sam_tuple', ('sample_id', 'group1', 'group2', 'sex')) #Encodes the rows of the samples table
 obs_tuple = namedtuple('obs_tuple', ('pos', 'read_id', 'base')) #Encodes the rows of the observations table
 
-def LLR(y,x):
-    """ Calculates the logarithm of y over x and deals with edge cases. """
-    if x and y:
-        result = log(y/x)
-    elif x and not y:
-        result = -1.23456789
-    elif not x and y:
-        result = +1.23456789
-    elif not x and not y:
-        result = 0
-    else:
-        result = None
-    return result
+try:
+    from numba import vectorize, njit
+    from math import log
+
+    @vectorize(['float64(float64, float64)'], nopython=True)
+    def vectorized_LLR(y,x):
+        """ Calculates element-wise the logarithm of y over x and deals with edge cases. """
+        if x and y:
+            return log(y/x)
+        elif x:
+            return -1.23456789
+        elif y:
+            return +1.23456789
+        else:
+            return 0.0
+
+    ### An explicit signature compiles the function at import, such that the forked workers never compile it again.
+    @njit('UniTuple(float64[:], 2)(float64[:,:], int64[:,:])')
+    def binned_mean_and_std(A, bounds):
+        """ For each bin, calculates the mean and population standard deviation
+            of the mean of the random variables in the rows bounds[k,0] to
+            bounds[k,1] of A, in a single pass over the rows of the bin. """
+        K, N = bounds.shape[0], A.shape[1]
+        means, stds = np.empty(K), np.empty(K)
+        col_sums = np.empty(N)
+        for k in range(K):
+            lo, hi = bounds[k,0], bounds[k,1]
+            col_sums[:] = 0.0
+            for i in range(lo, hi):
+                for j in range(N):
+                    col_sums[j] += A[i,j]
+            mu = col_sums.sum() / N
+            var = 0.0
+            for j in range(N):
+                var += (col_sums[j] - mu)**2
+            means[k] = mu / (hi - lo)
+            stds[k] = np.sqrt(var / (N - 1)) / (hi - lo)
+        return means, stds
+
+except ModuleNotFoundError:
+    print('Caution: The module numba is missing. The LLRs would be calculated via NumPy instead.')
+
+    def vectorized_LLR(y,x):
+        """ Calculates element-wise the logarithm of y over x and deals with edge cases. """
+        result = np.zeros(len(y), dtype=np.float64)
+        both = (x!=0) & (y!=0)
+        result[both] = np.log(y[both]/x[both])
+        result[(x!=0) & (y==0)] = -1.23456789
+        result[(x==0) & (y!=0)] = +1.23456789
+        return result
+
+    def binned_mean_and_std(A, bounds):
+        """ For each bin, calculates the mean and population standard deviation
+            of the mean of the random variables in the rows bounds[k,0] to
+            bounds[k,1] of A. The bins are sorted and non-overlapping. """
+        if len(bounds)==0:
+            return np.empty(0), np.empty(0)
+        M, N = bounds[:,1] - bounds[:,0], A.shape[1]
+        indices = bounds.ravel()
+        if indices[-1]==len(A): indices = indices[:-1] ### The last segment of reduceat extends to the end of A.
+        col_sums = np.add.reduceat(A, indices, axis=0)[::2] ### Odd segments lie between the bins.
+        mu = col_sums.sum(axis=1) / N
+        std = np.sqrt(((col_sums - mu[:,None])**2).sum(axis=1) / (N - 1)) / M
+        return mu / M, std
+
+#The data of chromosome length was taken from https://www.ncbi.nlm.nih.gov/grc/human/data?asm=GRCh38
+CHR_LENGTH = {'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259,
+              'chr6': 170805979, 'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422,
+              'chr11': 135086622, 'chr12': 133275309, 'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189,
+              'chr16': 90338345, 'chr17':  83257441, 'chr18': 80373285, 'chr19': 58617616, 'chr20': 64444167,
+              'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415}
 
 def chr_length(chr_id):
     """ Return the chromosome length for a given chromosome, based on the reference genome hg38."""
-    #The data of chromosome length was taken from https://www.ncbi.nlm.nih.gov/grc/human/data?asm=GRCh38
-    length_dict = {'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259,
-                  'chr6': 170805979, 'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422,
-                  'chr11': 135086622, 'chr12': 133275309, 'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189,
-                  'chr16': 90338345, 'chr17':  83257441, 'chr18': 80373285, 'chr19': 58617616, 'chr20': 64444167,
-                  'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415}
-    return length_dict[chr_id]
+    return CHR_LENGTH[chr_id]
 
 def mean_and_std_of_mean_of_rnd_var(A):
     """ Calculates the mean and population standard deviation of the mean of random variables.
         Each row of A represents a random variable, with observations in the columns."""
     if type(A)==dict:
-        A = tuple(tuple(i) for i in A.values()) 
-    
-    M, N = len(A), len(A[0])
-    mu = sum(sum(likelihoods_in_window)/N for likelihoods_in_window in A)
-    arg = ((sum(sampled_likelihoods) - mu)**2 for sampled_likelihoods in zip(*A))
-    std = (sum(arg) / (N - 1))**.5 / M
+        A = [*A.values()]
+    if type(A)!=np.ndarray:
+        N = min(map(len, A)) ### Rows are truncated to the smallest number of observations.
+        A = np.array([a[:N] for a in A], dtype=np.float64)
+
+    M, N = A.shape
+    col_sums = A.sum(axis=0)
+    mu = col_sums.sum() / N
+    std = np.sqrt(((col_sums - mu)**2).sum() / (N - 1)) / M
     mean = mu / M
-    return mean, std
+    return float(mean), float(std)
 
 def load_likelihoods(filename):
     """ Loads from a file a dictionary that lists genomic windows that contain
     at least two reads and gives the bootstrap distribution of the
     log-likelihood ratios (LLRs). """
-    
-    Open = {'bz2': bz2.open, 'gzip': gzip.open}.get(filename.rpartition('.')[-1], open)
+
+    ext = filename.rpartition('.')[-1]
     try:
-        with Open(filename, 'rb') as f:
+        if ext=='bz2': ### Decompressing the whole file in a single call is faster than streaming it to the unpickler.
+            with open(filename, 'rb') as raw:
+                f = io.BytesIO(bz2.decompress(raw.read()))
+        else:
+            Open = OPENERS.get(ext, open)
+            f = io.BufferedReader(Open(filename, 'rb'), buffer_size=1<<20)
+        with f:
             likelihoods = pickle.load(f)
             info = pickle.load(f)
         return likelihoods, info
@@ -95,37 +172,22 @@ def show_info(filename, info, pairs):
     print('Mean and standard error of meaningful reads per genomic window: %.1f, %.1f.' % (S.get('reads_mean',0), S.get('reads_std',0)))
     print('Ancestral makeup: %s, Fraction of alleles matched to the reference panel: %.3f.' % (ancestral_makeup, info['statistics']['matched_alleles']))
 
+    LLRs_per_chromosome = S.get('LLRs_per_chromosome', {})
     for pair in pairs:
-        if 'LLRs_per_chromosome' in S and tuple(pair) in S['LLRs_per_chromosome']:
-            L = S['LLRs_per_chromosome'][tuple(pair)]
+        L = LLRs_per_chromosome.get(tuple(pair))
+        if L is not None:
             print(f"--- Chromosome-wide LLR between {pair[0]:s} and {pair[1]:s} ----")
             print(f"Mean LLR: {L['mean_of_mean']:.3f}, Standard error of the mean LLR: {L['std_of_mean']:.3f}")
             print(f"Fraction of genomic windows with a negative LLR: {L['fraction_of_negative_LLRs']:.3f}")
         
 
 def bin_genomic_windows(windows,chr_id,num_of_bins):
-    """ Lists the bins and gives the genomic windows that they contain. """
+    """ Lists the bins by their index and gives the genomic windows that they contain. """
     bin_size = chr_length(chr_id) / num_of_bins
-    result = {}
-    j = 0
-    
-    for i in range(num_of_bins): ### All bins before the first the genomic window are filled with Nones.
-        if sum(windows[0])/2 < (i+1)*bin_size:
-            break
-        result[i/num_of_bins,(i+1)/num_of_bins] = None
-    
-    for k,(a,b) in enumerate(windows):
-        if not bin_size*i <= (a+b)/2 < bin_size*(i+1):
-            result[i/num_of_bins,(i+1)/num_of_bins] = (j,k)
-            j = k
-            for i in range(i+1,num_of_bins): #Proceed to the next non-empty bin; Empty bins are filled with Nones.
-                if (a+b)/2 < (i+1)*bin_size:
-                    break
-                result[i/num_of_bins,(i+1)/num_of_bins] = None
-    
-    for i in range(i,num_of_bins): ### All bins after the last the genomic window are filled with Nones.
-        result[i/num_of_bins,(i+1)/num_of_bins] = (j,k) if j != k else None
-        j = k 
+    edges = np.arange(num_of_bins+1) * bin_size ### The i-th bin spans the interval [edges[i], edges[i+1]).
+    mids = np.fromiter(((a+b)/2 for a,b in windows), dtype=np.float64, count=len(windows))
+    idx = np.searchsorted(mids, edges).tolist() ### The genomic windows are sorted by their position along the chromosome.
+    result = {i: (idx[i],idx[i+1]) if idx[i]!=idx[i+1] else None for i in range(num_of_bins)}
     return result
 
 def binning(LLRs_per_window,info,num_of_bins):
@@ -138,9 +200,18 @@ def binning(LLRs_per_window,info,num_of_bins):
     #K,M,V = tuple(LLR_stat.keys()), *zip(*LLR_stat.values())
     list_of_windows = [*LLRs_per_window.keys()]
     bins = bin_genomic_windows(list_of_windows, info['chr_id'], num_of_bins)
-    X = [*bins]
+    X = [(i/num_of_bins,(i+1)/num_of_bins) for i in bins] ### The bin indices are converted to boundaries only here.
     
     LLR_matrix = [*LLRs_per_window.values()]
+    if len({*map(len, LLR_matrix)})==1: ### When all the windows have the same number of samples, all the bins are processed in a single call.
+        LLR_matrix = np.array(LLR_matrix, dtype=np.float64)
+        nonempty = [i for i,C in bins.items() if C]
+        bounds = np.array([bins[i] for i in nonempty], dtype=np.int64).reshape(-1,2)
+        Y, E = [None]*num_of_bins, [None]*num_of_bins
+        for i, mean, std in zip(nonempty, *binned_mean_and_std(LLR_matrix, bounds)):
+            Y[i], E[i] = float(mean), float(std)
+        return X,Y,E
+
     Y, E = [], []
     for C in bins.values():
         if C:
@@ -153,97 +224,171 @@ def binning(LLRs_per_window,info,num_of_bins):
     
     return X,Y,E
 
-def collect_data(criteria, num_of_bins, work_dir):
+def analyze_file(filename, criteria, scenarios, num_of_bins):
+    """ Analyzes a single data file (via the bucketing function), provided that
+    it fits the criteria. Returns the scenario, the chromosome ID, the filename
+    and the analysis, or None when the file is rejected. """
+
+    likelihoods, info = load_likelihoods(filename)
+    subinfo = {x: info.get(x,None) for x in criteria.keys()}
+    scenario = SIMULATED_FILENAME.match(os.path.basename(filename))['scenario']
+
+    ###show_info(filename, info, scenarios)
+    ###print(subinfo)
+    ###print(criteria)
+    ###print(criteria==subinfo)
+    ###print(scenario, scenarios)
+    if subinfo==criteria and scenario in scenarios:
+        chr_id = info['chr_id']
+
+        ### The likelihoods of all the genomic windows are stacked into a single array, where each column holds one scenario.
+        ### Thus, the dictionary is walked once and the LLRs are calculated in a single call.
+        fields = next(iter(likelihoods.values()))[0]._fields
+        lengths = [*map(len, likelihoods.values())]
+        A = np.fromiter(chain.from_iterable(chain.from_iterable(likelihoods.values())), dtype=np.float64, count=len(fields)*sum(lengths)).reshape(-1, len(fields))
+        y, x = A[:,fields.index(scenarios[0])], A[:,fields.index(scenarios[1])]
+        LLRs = dict(zip(likelihoods, np.split(vectorized_LLR(y, x), np.cumsum(lengths[:-1]))))
+
+        X, Y, E = binning(LLRs,info,num_of_bins)
+        ### The means and standard errors of the buckets are stored as float32 arrays, where empty buckets are NaN.
+        buckets = {'means': np.array([np.nan if mean is None else mean for mean in Y], dtype=np.float32),
+                   'stds': np.array([np.nan if std is None else std for std in E], dtype=np.float32)}
+        return scenario, chr_id, filename, buckets
+    return None
+
+CACHE_FORMAT = 3 ### Bumped whenever the structure of the cached analysis changes.
+
+def process_file(filename, criteria, scenarios, num_of_bins, cache_dir=None):
+    """ Wraps the function analyze_file. When a cache directory is given, the
+    analysis of a file is stored there and reused as long as the file, the
+    criteria and the number of bins are unchanged. """
+
+    try:
+        if cache_dir:
+            canonical = sorted((k, sorted(v) if type(v)==set else v) for k,v in criteria.items())
+            key = hashlib.blake2b(f"{CACHE_FORMAT}|{os.path.abspath(filename)}|{os.path.getmtime(filename)}|{num_of_bins}|{scenarios}|{canonical}".encode()).hexdigest()
+            cache_filename = os.path.join(cache_dir, key + '.p')
+            if os.path.isfile(cache_filename):
+                with open(cache_filename, 'rb') as f:
+                    return pickle.load(f)
+
+        result = analyze_file(filename, criteria, scenarios, num_of_bins)
+
+        if cache_dir:
+            with open(cache_filename + '.tmp', 'wb') as f:
+                pickle.dump(result, f, protocol=4)
+            os.replace(cache_filename + '.tmp', cache_filename) ### Ensures that partially written files are never read.
+        return result
+    except Exception as err:
+        print(err)
+    return None
+
+SIMULATED_FILENAME = re.compile(r'simulated\.(?P<scenario>[^.]*)\..*LLR\.p') ### e.g., simulated.BPH.X0.10.0.chr21.LLR.p.bz2
+
+def simulated_files(work_dir, scenarios):
+    """ Yields the paths of the simulated LLR files in the folder, while
+    scanning the directory. Files of other scenarios are skipped before they
+    are loaded. """
+
+    with os.scandir(work_dir.rstrip('/') or '/') as it:
+        for entry in it:
+            m = SIMULATED_FILENAME.match(entry.name)
+            if m and m['scenario'] in scenarios:
+                yield entry.path
+
+def collect_data(criteria, num_of_bins, work_dir, cache_dir=None):
     """ Iterates over all the data files in the folder and creates a dictionary
     the list all the files that fit the criteria and gives their analysis
-    (via the bucketing function). """
+    (via the bucketing function). The files are analyzed in parallel. """
 
-    import glob
-    
     scenarios = criteria['scenarios']
     del criteria['scenarios']
-    
-    filenames = glob.glob(work_dir.rstrip('/') +'/'+ "simulated*LLR.p*")
+
+    if cache_dir: os.makedirs(cache_dir, exist_ok=True)
+
+    filenames = simulated_files(work_dir, scenarios)
     result = {scenarios[0]: defaultdict(dict), scenarios[1]: defaultdict(dict)}
-    for filename in filenames:
-        try:
-            likelihoods, info = load_likelihoods(filename)
-            if likelihoods==None: continue
-            subinfo = {x: info.get(x,None) for x in criteria.keys()}
-            scenario = filename.split('.',2)[1]
-            
-            ###show_info(filename, info, scenarios)
-            ###print(subinfo)
-            ###print(criteria)
-            ###print(criteria==subinfo)
-            ###print(scenario, scenarios)
-            if subinfo==criteria and scenario in scenarios:
-                chr_id = info['chr_id']
-                                                                    
-                LLRs = {window: tuple(LLR(attrgetter(scenarios[0])(l), attrgetter(scenarios[1])(l)) for l in likelihoods_in_window)
-                                   for window,likelihoods_in_window in likelihoods.items()} 
-                
-                result[scenario][chr_id][filename] = {bucket: {'mean': mean, 'std': std}
-                                                   for (bucket,mean,std) in zip(*binning(LLRs,info,num_of_bins))}
-        except Exception as err:
-            print(err)
+    with ProcessPoolExecutor() as executor:
+        for r in executor.map(partial(process_file, criteria=criteria, scenarios=scenarios, num_of_bins=num_of_bins, cache_dir=cache_dir), filenames, chunksize=8):
+            if r!=None:
+                scenario, chr_id, filename, buckets = r
+                result[scenario][chr_id][filename] = buckets
     return result
 
+def stack_means_and_stds(files):
+    """ Stacks the mean LLRs and their standard errors from all the files into
+    two matrices, where each row corresponds to a file and each column to a
+    bucket. Empty buckets are NaN. """
+    files = [*files]
+    means = np.array([file['means'] for file in files], dtype=np.float32).reshape(len(files),-1)
+    stds = np.array([file['stds'] for file in files], dtype=np.float32).reshape(len(files),-1)
+    return means, stds
+
 def prediction_rates(data, thresholds, positive='both'):
-    """ Creates a nested dictionary that lists chromosomes, buckets and
-    thresholds. For each entry the dictionary gives the false and true positive
-    rates. """
+    """ Creates an array that gives the false and true positive rates, where
+    the axes correspond to chromosomes, buckets, thresholds and the two rates.
+    Entries of buckets that are empty in all files are set to NaN. The labels
+    of the first three axes are returned together with the array. """
 
     label_B, label_A = data.keys()
     B, A = data.values()
-    
-    prediction_rates = {}
-    for chr_id in A:
-        prediction_rates[chr_id] = {}
-        some_filename = next(iter(A[chr_id]))
+    Z = np.asarray(thresholds, dtype=np.float32) ### Matches the precision of the stored means and standard errors.
+
+    chr_ids = tuple(A)
+    num_of_bins = len(next(iter(A[chr_ids[0]].values()))['means']) if chr_ids else 0
+    buckets = tuple((i/num_of_bins,(i+1)/num_of_bins) for i in range(num_of_bins))
+    rates = np.full((len(chr_ids), num_of_bins, len(Z), 2), np.nan, dtype=np.float32)
+
+    if positive not in ('both', label_A, label_B):
+        return {'chr_ids': chr_ids, 'buckets': buckets, 'thresholds': Z, 'rates': rates}
+
+    for c, chr_id in enumerate(chr_ids):
         ###print(len(A[chr_id]),len(B[chr_id]))
-        for bucket in A[chr_id][some_filename]:
-            prediction_rates[chr_id][bucket] = {}
-            for z in thresholds:
-                true_B = [file[bucket]['mean'] > z * file[bucket]['std'] for file in B[chr_id].values() if file[bucket]['mean']!=None]
-                false_B = [file[bucket]['mean'] > z * file[bucket]['std'] for file in A[chr_id].values() if file[bucket]['mean']!=None]
-
-                false_A = [file[bucket]['mean'] < -z * file[bucket]['std'] for file in B[chr_id].values() if file[bucket]['mean']!=None]
-                true_A = [file[bucket]['mean'] < -z * file[bucket]['std'] for file in A[chr_id].values() if file[bucket]['mean']!=None]
-
-                if true_B==[] or false_B==[]:
-                    break
-                elif positive == 'both':
-                    TPR = 0.5 * (true_B.count(1)/len(true_B) + true_A.count(1)/len(true_A))
-                    FPR = 0.5 * (false_B.count(1)/len(false_B) + false_A.count(1)/len(false_A))
-                elif positive == label_A:
-                    TPR = true_A.count(1)/len(true_A)
-                    FPR = false_A.count(1)/len(false_A)
-                elif positive == label_B:
-                    TPR = true_B.count(1)/len(true_B)
-                    FPR = false_B.count(1)/len(false_B)
-                else:
-                    break
-
-                prediction_rates[chr_id][bucket][z] = (FPR,TPR) ### <--- Structure of the nested dictionary
-
-    return prediction_rates
-
-def main(work_dir,output_filename,number_of_bins,criteria,compress):
+        mB, sB = stack_means_and_stds(B[chr_id].values())
+        mA, sA = stack_means_and_stds(A[chr_id].values())
+
+        ### Number of files with a non-empty bucket. Comparisons with NaN are false, so empty buckets are never counted.
+        nB = (~np.isnan(mB)).sum(axis=0)[:,None]
+        nA = (~np.isnan(mA)).sum(axis=0)[:,None]
+
+        ### The axes correspond to files, buckets and thresholds; summing over the files leaves a bucket by threshold matrix.
+        with np.errstate(invalid='ignore', divide='ignore'):
+            true_B = (mB[:,:,None] > Z * sB[:,:,None]).sum(axis=0) / nB
+            false_B = (mA[:,:,None] > Z * sA[:,:,None]).sum(axis=0) / nA
+
+            false_A = (mB[:,:,None] < -Z * sB[:,:,None]).sum(axis=0) / nB
+            true_A = (mA[:,:,None] < -Z * sA[:,:,None]).sum(axis=0) / nA
+
+        if positive == 'both':
+            TPR = 0.5 * (true_B + true_A)
+            FPR = 0.5 * (false_B + false_A)
+        elif positive == label_A:
+            TPR, FPR = true_A, false_A
+        elif positive == label_B:
+            TPR, FPR = true_B, false_B
+
+        empty = ((nA==0) | (nB==0))[:,0] ### Buckets that are empty in all files of either scenario.
+        rates[c, ~empty, :, 0] = FPR[~empty]
+        rates[c, ~empty, :, 1] = TPR[~empty]
+
+    return {'chr_ids': chr_ids, 'buckets': buckets, 'thresholds': Z, 'rates': rates} ### <--- Structure of the returned dictionary
+
+def main(work_dir,output_filename,number_of_bins,criteria,compress,cache_dir=None):
     """ Creates Balanced ROC curves for predicting aneuploidy. """
     
     assert os.path.isdir(work_dir), 'The path to the directory that contains simulated data does not exist.'
-    Z = [i/33 for i in [*range(-1800,-300,300)]+[*range(-300,300)]+[*range(300,1800,300)]]
-    data = collect_data(criteria.copy(), number_of_bins, work_dir)
+    assert compress=='unc' or compress in OPENERS, f'The module that is required for {compress} compression is missing.'
+    Z = np.array([*range(-1800,-300,300)]+[*range(-300,300)]+[*range(300,1800,300)], dtype=np.float32) / 33
+    data = collect_data(criteria.copy(), number_of_bins, work_dir, cache_dir)
     R = prediction_rates(data, thresholds = Z)
     N = {scenario: {chr_id: len(data[scenario][chr_id]) for chr_id in data[scenario]} for scenario in data}
     
-    Open = {'bz2': bz2.open, 'gz': gzip.open}.get(compress, open)
-    ext = ('.'+compress) * (compress in ('bz2','gz'))
+    Open = OPENERS.get(compress, open)
+    ext = ('.'+compress) * (compress in OPENERS)
     with Open(output_filename + ext, "wb") as f:
         pickle.dump(criteria, f, protocol=4) #Simulation info
         pickle.dump(N, f, protocol=4) #Statistical info
-        pickle.dump(R, f, protocol=4) #BTPR vs. BFPR for each bin along the genome
+        pickle.dump(R, f, protocol=4) #BFPR and BTPR for each bin along the genome and each threshold
         
     return N, R
 
@@ -257,8 +402,10 @@ if __name__ == "__main__":
                         help='The output filename.')
     parser.add_argument('-n', '--number-of-bins', type=int, metavar='INT',  default='15',
                         help='The genome is divided into bins and for each bin a ROC curve is calculated. Default value is 15.')
-    parser.add_argument('-c', '--compress', metavar='gz/bz2/unc', type=str, default='unc',  choices=['gz','bz2','unc'],
-                        help='Output compressed via gzip, bzip2 or uncompressed. Default is uncompressed.')
+    parser.add_argument('-c', '--compress', metavar='gz/bz2/lz4/zst/unc', type=str, default='unc',  choices=['gz','bz2','lz4','zst','unc'],
+                        help='Output compressed via gzip, bzip2, lz4, zstd or uncompressed. Default is uncompressed.')
+    parser.add_argument('-C', '--cache-dir', type=str, metavar='PATH',
+                        help='A directory for caching the analysis of each simulated file, such that reruns skip the loading of unchanged files. By default, no cache is used.')
     parser.add_argument('-o', '--scenarios', type=str, nargs=2,
                         metavar='BPH/SPH/disomy/monosomy', default=['BPH', 'SPH'], choices=['BPH','SPH','disomy','monosomy'],
                         help="Two simulated scenarios for which a balanced ROC curve would be created. The default is \"BPH SPH\". ")
@@ -315,7 +462,7 @@ if __name__ == "__main__":
     print('- Path to simulated data:',args['path_to_simulated_data'],'\n- Output filename:',args['output_filename'],'\n- Number of bins:',args['number_of_bins'])
     print('- Criteria:')
     print("\n".join("\t{}. {}:\t{}".format(i, k, v) for i, (k, v) in enumerate(criteria.items(),start=1)))
-    N,R = main(args['path_to_simulated_data'],args['output_filename'],args['number_of_bins'],criteria,args['compress'])
+    N,R = main(args['path_to_simulated_data'],args['output_filename'],args['number_of_bins'],criteria,args['compress'],args['cache_dir'])
     print('- Simulated files that fulfilled the criteria:\n',N)
     sys.exit(0)
 else:
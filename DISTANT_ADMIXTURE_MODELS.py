@@ -22,7 +22,7 @@ import pickle, os, sys, bz2, collections, gzip, platform
 
 from functools import reduce
 from operator import and_, itemgetter
-from itertools import combinations
+from itertools import combinations, compress
 
 leg_tuple = collections.namedtuple('leg_tuple', ('chr_id', 'pos', 'ref', 'alt')) #Encodes the rows of the legend table
 obs_tuple = collections.namedtuple('obs_tuple', ('pos', 'read_id', 'base')) #Encodes the rows of the observations table
@@ -86,7 +86,9 @@ class distant_admixture:
 
         hap_dict = dict()
         mismatches = 0
-        combined = {pos: (ref,alt,hap) for (chr_id,pos,ref,alt),hap in zip(leg_tab, hap_tab)}
+        observed = {pos for (pos, read_id, base) in obs_tab}
+        rows = compress(zip(leg_tab, hap_tab), map(observed.__contains__, map(itemgetter(1), leg_tab)))
+        combined = {pos: (ref,alt,hap) for (chr_id,pos,ref,alt),hap in rows}
         missing = 3*(None,)
 
         b = (1 << number_of_haplotypes) - 1 #### equivalent to int('1'*number_of_haplotypes,2)
@@ -172,10 +174,11 @@ class distant_admixture:
                    for group2, internal in intrenal_hap_dict_per_group.items()}
             result[C[0]|C[1]|C[2]] = self.effective_joint_frequency(hap)
 
+        groups = tuple(intrenal_hap_dict_per_group)
+        values_per_group = tuple(tuple(internal.values()) for internal in intrenal_hap_dict_per_group.values()) ### The values are ordered as the representations.
         for r in range(4,len(alleles)):
-            for C in combinations(representations, r):
-                hap = {group2: reduce(and_,itemgetter(*C)(internal))
-                       for group2, internal in intrenal_hap_dict_per_group.items()}
+            for C, *A in zip(combinations(representations, r), *(combinations(values, r) for values in values_per_group)):
+                hap = {group2: reduce(and_,B) for group2, B in zip(groups, A)}
                 result[sum(C)] = self.effective_joint_frequency(hap)
 
         if len(alleles)>=4:
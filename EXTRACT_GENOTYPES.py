@@ -9,16 +9,37 @@ Daniel Ariad (daniel@ariad.org)
 Jan 13, 2021
 """
 import pickle, os, sys, time, argparse, random, gzip, collections
+from functools import lru_cache
+from contextlib import nullcontext
 
 leg_tuple = collections.namedtuple('leg_tuple', ('chr_id', 'pos', 'ref', 'alt')) #Encodes the rows of the legend table
 sam_tuple = collections.namedtuple('sam_tuple', ('sample_id', 'group1', 'group2', 'sex')) #Encodes the rows of the samples table
 obs_tuple = collections.namedtuple('obs_tuple', ('pos', 'read_id', 'base')) #Encodes the rows of the observations table
+
+PANEL_SEMAPHORE = None #Bounds the number of processes that load reference panels at the same time.
+
+def set_panel_semaphore(semaphore):
+    """ Initializes each process of a pool with a shared semaphore, which
+    bounds the number of processes that load reference panels at the same
+    time. """
+    global PANEL_SEMAPHORE
+    PANEL_SEMAPHORE = semaphore
+
+@lru_cache(maxsize=4)
+def load_panel_file(filename):
+    """ Loads a gzipped file of the reference panel. The last few files are
+    cached, since the legend, haplotypes and samples of the same panel are
+    read for every sample that is extracted in the same process. The
+    returned objects are shared and thus should not be modified. """
+
+    with PANEL_SEMAPHORE or nullcontext(): ### Only a cache miss reads from the disk.
+        with gzip.open(filename, 'rb') as f:
+            return pickle.load(f)
     
 def get_haplotypes(sample_filename, hap_filename, sample_id, group2):
     """ Extracts haplotypes that correspond to a specific sample ID. """
 
-    with gzip.open(sample_filename, 'rb') as sam_in:
-        SAM = pickle.load(sam_in)[group2]
+    SAM = load_panel_file(sample_filename)[group2]
     
     samples = [s.sample_id for s in SAM]
     
@@ -28,8 +49,7 @@ def get_haplotypes(sample_filename, hap_filename, sample_id, group2):
         raise Exception('Error: sample_id not found.')
     
     bits2tuple = {0: (0,0), 1: (0,1), 2: (1,0), 3: (1,1)}
-    with gzip.open(hap_filename,'rb') as hap_in:
-        hap_tab = pickle.load(hap_in)[group2]
+    hap_tab = load_panel_file(hap_filename)[group2]
     shift_count =  2*(ind-1)
     result = [bits2tuple[(h >> shift_count) & 0b11] for h in hap_tab]
 
@@ -51,8 +71,7 @@ def extract(leg_filename,hap_filename,samp_filename,chr_id,sample_id,group2,**kw
 
     haplotypes = get_haplotypes(samp_filename, hap_filename, sample_id, group2)
     
-    with gzip.open(leg_filename,'rb') as leg_in:
-        legend = pickle.load(leg_in)
+    legend = load_panel_file(leg_filename)
 
     info = {'chr_id': chr_id,
             'depth': 1,
@@ -20,11 +20,18 @@ import pickle, os, sys, bz2, collections, gzip, platform
 
 from functools import reduce
 from operator import and_, itemgetter
-from itertools import combinations
+from itertools import combinations, compress
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    print('Caution: The module numpy is missing. The likelihoods of more than seven alleles would be calculated via pure python instead.')
+    np = None
 
 leg_tuple = collections.namedtuple('leg_tuple', ('chr_id', 'pos', 'ref', 'alt')) #Encodes the rows of the legend table
 obs_tuple = collections.namedtuple('obs_tuple', ('pos', 'read_id', 'base')) #Encodes the rows of the observations table
 likelihoods_tuple = collections.namedtuple('likelihoods_tuple', ('monosomy', 'disomy', 'SPH', 'BPH')) #Encodes the likelihoods for four scenarios, namely, monosomy, disomy, SPH and BPH.
+MAX_SPECIALIZED_ALLELES = 7 #Up to this number of alleles, the likelihoods are calculated by functions that are generated from the models. Beyond it, the generated code grows exponentially and numpy is faster.
 
 ### Getting a function to count non-zero bits in positive integer.
 class popcount_lk:
@@ -43,11 +50,19 @@ class popcount_lk:
 
         return sum(x.to_bytes((x.bit_length()>>3)+1,self.byteorder).translate(self.lookup_table))
 
+def popcount_np(x):
+    """ Calculates the population count of a python integer by viewing it as
+        an array of 64-bit words and counting the bits of each word via
+        numpy.bitwise_count, which requires numpy v2.0 or above. """
+
+    return int(np.bitwise_count(np.frombuffer(x.to_bytes(((x.bit_length()+63)>>6)<<3,'little'), dtype=np.uint64)).sum())
+
 class homogeneous:
     """ Based on the statisitcal models (models_dict) and the reference panel
     (leg_tab, hap_tab and sam_tab), it allows to calculate the likelihoods of
     observed alleles under various statistical models (monosomy, disomy, SPH and BPH). """
 
+    __slots__ = ('models_dict', 'flat_models', 'number_of_haplotypes', 'fraction_of_matches', 'hap_dict', 'specialized_models') ### Fixed attributes are faster to access and lighter than an instance dictionary.
 
     def __init__(self, obs_tab, leg_tab, hap_tab_per_group, number_of_haplotypes_per_group, models_dict):
         """ Initialize the attributes of the class. """
@@ -58,6 +73,8 @@ class homogeneous:
             raise Exception('Error: The non-admixed models can not be applied when the HAP file includes multiple superpopulations/group2.')
 
         self.models_dict = models_dict
+        self.flat_models = {}
+        self.specialized_models = {}
         group2 = [*hap_tab_per_group.keys()].pop()
         hap_tab = hap_tab_per_group[group2]
         self.number_of_haplotypes = number_of_haplotypes_per_group[group2]
@@ -77,16 +94,25 @@ class homogeneous:
         """ Returns a dictionary that lists SNP alleles and gives their
         relevent row from haplotypes table. The row is stored as bits, where
         True means that the haplotype contains the allele. We denote the
-        returned dictionary as the reference panel. """
+        returned dictionary as the reference panel.
+
+        Each row is a python integer, which serves as a packed bitset: the
+        integer is stored as a contiguous array of machine words and both the
+        bitwise AND and the population count (int.bit_count) loop over these
+        words in C, without allocating a Python object per word. """
 
         hap_dict = dict()
         mismatches = 0
-        combined = {pos: (ref,alt,hap) for (chr_id,pos,ref,alt),hap in zip(leg_tab, hap_tab)}
+        observed = {pos for (pos, read_id, base) in obs_tab}
+        rows = compress(zip(leg_tab, hap_tab), map(observed.__contains__, map(itemgetter(1), leg_tab)))
+        combined = {pos: (ref,alt,hap) for (chr_id,pos,ref,alt),hap in rows}
         missing = 3*(None,)
 
         b = (1 << number_of_haplotypes) - 1 #### equivalent to int('1'*number_of_haplotypes,2)
 
         for (pos, read_id, base) in obs_tab:
+            if (pos,base) in hap_dict: ### Alleles that are observed by several reads are flipped only once.
+                continue
             ref, alt, hap = combined.get(pos, missing)
             if base==alt:
                 hap_dict[(pos,base)] = hap
@@ -108,19 +134,20 @@ class homogeneous:
         by their index is returned. The dictionary gives for each allele and
         haplotype their associated tuple and intersected tuple, respectively. """
 
+        hap_dict = self.hap_dict ### Local names are resolved faster than attributes.
         internal = {}
         for i, haplotype in enumerate(alleles):
             if type(haplotype[0])==tuple: #Checks if X is a tuple/list of alleles.
                 n = len(haplotype)
                 if n==1:
-                    internal[1 << i] = self.hap_dict[haplotype[0]]
+                    internal[1 << i] = hap_dict[haplotype[0]]
                 elif n==2:
-                    internal[1 << i] = self.hap_dict[haplotype[0]] & self.hap_dict[haplotype[1]]
+                    internal[1 << i] = hap_dict[haplotype[0]] & hap_dict[haplotype[1]]
                 else:
-                    internal[1 << i] = reduce(and_,itemgetter(*haplotype)(self.hap_dict))
+                    internal[1 << i] = reduce(and_,itemgetter(*haplotype)(hap_dict))
 
             elif type(haplotype[0])==int: #Checks if X is a single allele.
-                internal[1 << i] = self.hap_dict[haplotype]
+                internal[1 << i] = hap_dict[haplotype]
             else:
                 raise Exception('error: joint_frequencies only accepts alleles and tuple/list of alleles.')
 
@@ -131,34 +158,53 @@ class homogeneous:
             observed alleles. The function arguments are alleles, that is,
             tuples of position and base, e.g., (100,'T'), (123, 'A') and
             (386, 'C'). Each allele is enumerated according to the order it
-            was received by the function. The function returns a dictionary that
-            lists all the possible subgroups of the given alleles. Each key in
-            the dictionary is a tuple of intergers that are lexicographically
-            sorted. Moreover, each integer within the keys corresponds to an
-            enumerated allele. For each subgroup of alleles the dictionary
-            gives the joint frequencies in a given population. The function
-            arguments can also include haplotypes, that is, tuples of alleles;
-            Haplotypes are treated in the same manner as alleles. """
+            was received by the function. The function returns a list that
+            is indexed by all the possible subgroups of the given alleles. Each
+            subgroup is encoded by an integer, where the i-th bit is set if the
+            i-th allele belongs to the subgroup. For each subgroup of alleles
+            the list gives the joint frequencies in a given population. The
+            function arguments can also include haplotypes, that is, tuples of
+            alleles; Haplotypes are treated in the same manner as alleles. """
 
-        hap = self.build_intrenal_hap_dict(alleles)
-
-        result = {c: popcount(A) for c,A in hap.items() }
+        result = self.joint_counts(alleles)
 
-        for C in combinations(hap, 2):
-            result[C[0]|C[1]] = popcount(hap[C[0]]&hap[C[1]])
+        if normalize:
+            N = self.number_of_haplotypes
+            result = [v/N for v in result]
 
-        for C in combinations(hap, 3):
-            result[C[0]|C[1]|C[2]] = popcount(hap[C[0]]&hap[C[1]]&hap[C[2]])
+        return result
 
-        for r in range(4,len(alleles)):
-            for C in combinations(hap, r):
-                result[sum(C)] = popcount(reduce(and_,itemgetter(*C)(hap)))
+    def joint_counts(self, alleles):
+        """ Returns a list that is indexed by all the possible subgroups of
+            the given alleles and gives the number of haplotypes in the
+            reference panel that contain each subgroup. The empty subgroup is
+            contained in all the haplotypes. """
 
-        if len(alleles)>=4:
-            result[sum(hap.keys())] = popcount(reduce(and_,hap.values()))
+        hap = self.build_intrenal_hap_dict(alleles)
 
-        if normalize:
-            result = {k: v/self.number_of_haplotypes for k,v in result.items()}
+        ### The subgroups are enumerated by integers, where the i-th bit is set
+        ### if the i-th allele belongs to the subgroup. The subgroups are
+        ### visited in ascending order and the intersection of each subgroup is
+        ### obtained from the intersection of the subgroup without its lowest
+        ### allele, so every subgroup costs a single bitwise AND. The partial
+        ### intersections are kept in a stack, which is keyed by the lowest
+        ### allele of each subgroup. The entry of a subgroup is not overwritten
+        ### before its supersets are visited, since the subgroups in between
+        ### only contain lower alleles.
+        stack = {0: -1} ### -1 has all its bits set, hence it is the identity of the bitwise AND.
+        count = popcount ### Binds the global function to a local name, which is resolved faster within the loop.
+        g, end = 1, 1 << len(alleles)
+        result = [0] * end
+        result[0] = self.number_of_haplotypes
+        while g < end:
+            low = g & -g
+            parent = g ^ low
+            stack[low] = A = stack[parent & -parent] & hap[low]
+            if A:
+                result[g] = count(A)
+                g += 1
+            else: ### The intersection is empty for the subgroups g,...,g+low-1, since they contain the subgroup g.
+                g += low
 
         return result
 
@@ -182,6 +228,58 @@ class homogeneous:
 
         return result
 
+    def flattened_models(self, number_of_alleles):
+        """ Returns the statistical models for a given number of alleles in a
+        flat form. For each scenario, the terms of each order are listed by
+        aligned arrays of coefficients (A0/A1) and indices of the joint
+        frequencies that are multiplied together. The flattened models are
+        cached per number of alleles. """
+
+        if number_of_alleles not in self.flat_models:
+            models = self.models_dict[number_of_alleles]
+            flat = {}
+            for scenario in ('BPH', 'SPH', 'DISOMY'):
+                (((A0, A1),((B0,),)),) = models[scenario][1].items()
+                second = [(A0 / A1, B0, B1) for (A0, A1), C in models[scenario][2].items() for (B0, B1) in C]
+                third = [(A0 / A1, B0, B1, B2) for (A0, A1), C in models[scenario].get(3,{}).items() for B0 in C for (B1, B2) in C[B0]]
+                second = [np.array(a, dtype=np.int64 if i else np.float64) for i, a in enumerate([*zip(*second)] or 3*[()])]
+                third = [np.array(a, dtype=np.int64 if i else np.float64) for i, a in enumerate([*zip(*third)] or 4*[()])]
+                flat[scenario] = (A0 / A1, B0, *second, *third)
+            ((B0,),) = models['MONOSOMY'][1][(1,1)]
+            flat['MONOSOMY'] = B0
+            self.flat_models[number_of_alleles] = flat
+        return self.flat_models[number_of_alleles]
+
+    def specialized_likelihoods(self, number_of_alleles):
+        """ Returns a function that calculates the likelihoods for a given
+        number of alleles. The function is generated from the statistical
+        models, such that the coefficients (A0/A1) and the indices of the joint
+        frequencies become literals of a single expression per scenario. The
+        generated functions are cached per number of alleles. """
+
+        if number_of_alleles not in self.specialized_models:
+            models = self.models_dict[number_of_alleles]
+            products = lambda C: ' + '.join('F[%d]*F[%d]' % B for B in C)
+            lines = ['def likelihoods(F, N):']
+            for scenario in ('BPH', 'SPH', 'DISOMY'):
+                (((A0, A1),((B0,),)),) = models[scenario][1].items()
+                first = '%r*F[%d]' % (A0 / A1, B0)
+                second = ' + '.join('%r*(%s)' % (A0 / A1, products(C))
+                                    for (A0, A1), C in models[scenario][2].items())
+                third = ' + '.join('%r*(%s)' % (A0 / A1, ' + '.join('F[%d]*(%s)' % (B0, products(C[B0])) for B0 in C))
+                                   for (A0, A1), C in models[scenario].get(3,{}).items() if C)
+                if third:
+                    lines.append('    %s = (%s + (%s + (%s)/N)/N)/N' % (scenario, first, second, third))
+                else:
+                    lines.append('    %s = (%s + (%s)/N)/N' % (scenario, first, second))
+            ((B0,),) = models['MONOSOMY'][1][(1,1)]
+            lines.append('    MONOSOMY = F[%d]/N' % B0)
+            lines.append('    return likelihoods_tuple(MONOSOMY, DISOMY, SPH, BPH)')
+            namespace = {'likelihoods_tuple': likelihoods_tuple}
+            exec(compile('\n'.join(lines), '<models of %d alleles>' % number_of_alleles, 'exec'), namespace)
+            self.specialized_models[number_of_alleles] = namespace['likelihoods']
+        return self.specialized_models[number_of_alleles]
+
     def likelihoods(self, alleles):
         """ Calculates the likelihood to observe a set with alleles
         and haplotypes under four scenarios, namely, monosomy, disomy, SPH
@@ -189,6 +287,19 @@ class homogeneous:
 
         F = self.joint_frequencies_combo(alleles, normalize=False)
         N = self.number_of_haplotypes #Divide values by N to normalize the joint frequencies.
+
+        if len(alleles) <= MAX_SPECIALIZED_ALLELES:
+            return self.specialized_likelihoods(len(alleles))(F, N)
+
+        if np: ### The sums over the terms of the models are calculated as dot products.
+            models = self.flattened_models(len(alleles))
+            F = np.array(F, dtype=np.float64) ### The joint frequencies are listed by the subgroup, where the empty subgroup contains all the haplotypes.
+            evaluate = lambda c1, B0, c2, B0s, B1s, c3, C0s, C1s, C2s: \
+                float(c1 * F[B0] / N + (c2 @ (F[B0s] * F[B1s])) / N**2 + (c3 @ (F[C0s] * F[C1s] * F[C2s])) / N**3)
+            BPH, SPH, DISOMY = evaluate(*models['BPH']), evaluate(*models['SPH']), evaluate(*models['DISOMY'])
+            MONOSOMY = float(F[models['MONOSOMY']]) / N
+            return likelihoods_tuple(MONOSOMY, DISOMY, SPH, BPH)
+
         models = self.models_dict[len(alleles)]
 
         ### BPH ###
@@ -262,9 +373,14 @@ class homogeneous:
         abc, abd, acd, bcd = F[7], F[11], F[13], F[14]
         abcd = F[15]
 
-        BPH = (abcd+2*(ab*c*d+a*bd*c+a*bc*d+ac*b*d+a*b*cd+ad*b*c+abc*d+a*bcd+acd*b+abd*c+ab*cd+ad*bc+ac*bd))/27  #The likelihood of three unmatched haplotypes.
-        SPH = (17*abcd+10*(abc*d+bcd*a+acd*b+abd*c)+8*(ab*cd+ad*bc+ac*bd))/81  #The likelihood of two identical haplotypes out three.
-        DISOMY = (abcd+abc*d+bcd*a+acd*b+abd*c+ab*cd+ad*bc+ac*bd)/8 #The likelihood of diploidy.
+        ### Sums of products that are shared by the scenarios, grouped by the partition of the four alleles.
+        P31 = abc*d+bcd*a+acd*b+abd*c
+        P22 = ab*cd+ad*bc+ac*bd
+        P211 = ab*c*d+a*bd*c+a*bc*d+ac*b*d+a*b*cd+ad*b*c
+
+        BPH = (abcd+2*(P211+P31+P22))/27  #The likelihood of three unmatched haplotypes.
+        SPH = (17*abcd+10*P31+8*P22)/81  #The likelihood of two identical haplotypes out three.
+        DISOMY = (abcd+P31+P22)/8 #The likelihood of diploidy.
         MONOSOMY = abcd #The likelihood of monosomy.
 
         return likelihoods_tuple(MONOSOMY, DISOMY, SPH, BPH)
@@ -339,27 +455,28 @@ def unit_test():
 
     alleles = tuple(A.hap_dict.keys())
 
-    frequencies = lambda x: {bin(a)[2:]:b for a,b in A.joint_frequencies_combo(x,normalize=True).items()}
+    frequencies = lambda x: {bin(a)[2:]:b for a,b in enumerate(A.joint_frequencies_combo(x,normalize=True)) if a}
     frequencies_redundant = lambda x: {bin(a)[2:]:b for a,b in A.joint_frequencies_redundant(x,normalize=True).items()}
 
 
     random.seed(a=2022, version=2)
     
     are_equivalent = lambda x,y: all(abs(i-j)<1e-10 for i,j in zip(x,y)) and len(x)==len(y)
+    are_equivalent_dicts = lambda x,y: x.keys()==y.keys() and are_equivalent(x.values(), [y[k] for k in x]) ### Subgroups are compared by their keys, regardless of their order.
     
     for i in range(1000):
         x = random.randrange(len(alleles)-16) #123
         haplotypes = (alleles[x:x+2],alleles[x+2:x+4],alleles[x+4:x+6],alleles[x+6:x+8])
     
-        assert are_equivalent(frequencies(alleles[x+0:x+1]).values(), frequencies_redundant(alleles[x+0:x+1]).values())
-        assert are_equivalent(frequencies(alleles[x:x+4]).values(), frequencies_redundant(alleles[x:x+4]).values())
-        assert are_equivalent(frequencies(alleles[x:x+2]).values(), frequencies_redundant(alleles[x:x+2]).values())
+        assert are_equivalent_dicts(frequencies(alleles[x+0:x+1]), frequencies_redundant(alleles[x+0:x+1]))
+        assert are_equivalent_dicts(frequencies(alleles[x:x+4]), frequencies_redundant(alleles[x:x+4]))
+        assert are_equivalent_dicts(frequencies(alleles[x:x+2]), frequencies_redundant(alleles[x:x+2]))
         assert are_equivalent(A.likelihoods(alleles[x:x+2]), A.likelihoods2(alleles[x:x+2]))
-        assert are_equivalent(frequencies(alleles[x:x+3]).values(), frequencies_redundant(alleles[x:x+3]).values())
+        assert are_equivalent_dicts(frequencies(alleles[x:x+3]), frequencies_redundant(alleles[x:x+3]))
         assert are_equivalent(A.likelihoods(alleles[x:x+3]), A.likelihoods3(alleles[x:x+3]))
-        assert are_equivalent(frequencies(alleles[x:x+4]).values(), frequencies_redundant(alleles[x:x+4]).values())
+        assert are_equivalent_dicts(frequencies(alleles[x:x+4]), frequencies_redundant(alleles[x:x+4]))
         assert are_equivalent(A.likelihoods(alleles[x:x+4]), A.likelihoods4(alleles[x:x+4]))
-        assert are_equivalent(frequencies(haplotypes).values(), frequencies_redundant(haplotypes).values())
+        assert are_equivalent_dicts(frequencies(haplotypes), frequencies_redundant(haplotypes))
         assert are_equivalent(A.likelihoods(haplotypes), A.likelihoods4(haplotypes))
     
     t1 = time.time()
@@ -376,7 +493,7 @@ else:
         from gmpy2 import popcount
     except Exception as error_msg:
         print(error_msg)
-        popcount = popcount_lk()
+        popcount = popcount_np if hasattr(np, 'bitwise_count') else popcount_lk()
 
 if __name__ != "__main__":
     print('The module HOMOGENOUES_MODELS was imported.')
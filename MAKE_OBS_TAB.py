@@ -24,13 +24,28 @@ try:
 except ModuleNotFoundError:
     print('Caution: The module pysam is missing.')
 
+OPENERS = {'bz2': bz2.open, 'gz': gzip.open} ### Opening methods according to the file extension.
+
+try:
+    import lz4.frame
+    OPENERS['lz4'] = lz4.frame.open
+except ModuleNotFoundError:
+    print('Caution: The module lz4 is missing. Files compressed via lz4 would not be supported.')
+
+try:
+    import zstandard
+    OPENERS['zst'] = zstandard.open
+except ModuleNotFoundError:
+    print('Caution: The module zstandard is missing. Files compressed via zstd would not be supported.')
+
 def save_obs(obs_tab,info,compress,bam_filename,output_filename,output_dir):
     """ Saves the observations table together with information about
         the chromosome number, depth of coverage, and flags that were used.
-        Also, data compression is supported in gzip and bzip2 formats. """
+        Also, data compression is supported in gzip, bzip2, lz4 and zstd formats. """
 
-    Open = {'bz2': bz2.open, 'gz': gzip.open}.get(compress, open)
-    ext = ('.'+compress) * (compress in ('bz2','gz'))
+    assert compress=='unc' or compress in OPENERS, f'The module that is required for {compress} compression is missing.'
+    Open = OPENERS.get(compress, open)
+    ext = ('.'+compress) * (compress in OPENERS)
     default_output_filename = re.sub('.[bB][aA][mM]$',f".{info['chr_id']:s}.obs.p{ext:s}",bam_filename.strip().split('/')[-1])
 
     if output_filename=='': 
@@ -47,7 +62,7 @@ def save_obs(obs_tab,info,compress,bam_filename,output_filename,output_dir):
 
 def load(filename):
     """ Adjusts the file opening method according to the file extension. """
-    return {'bz2': bz2.open, 'gz': gzip.open}.get(filename.rsplit('.',1)[1], open) 
+    return OPENERS.get(filename.rsplit('.',1)[1], open) 
 
 def retrive_bases(bam_filename,legend_filename,sample_filename,fasta_filename,handle_multiple_observations,min_bq,min_mq,max_depth,output_filename,compress,**kwargs):
     """ Retrives observed bases from known SNPs position. 
@@ -171,8 +186,8 @@ if __name__ == "__main__":
                         help='Maximum depth coverage to be considered (inclusive). Default value is 0, effectively removing the depth limit.')
     parser.add_argument('-o', '--output-filename', metavar='OUTPUT_FILENAME', type=str, default='',
                         help='Output filename. The default filename is the same as the BAM filename, but with an extension of .chr_id.obs.p')
-    parser.add_argument('-c', '--compress', metavar='gz/bz2/unc', type=str, default='unc',
-                        help='Output compressed via gzip, bzip2 or uncompressed. Default is uncompressed.')
+    parser.add_argument('-c', '--compress', metavar='gz/bz2/lz4/zst/unc', type=str, default='unc', choices=['gz','bz2','lz4','zst','unc'],
+                        help='Output compressed via gzip, bzip2, lz4, zstd or uncompressed. Default is uncompressed.')
 
     retrive_bases(**vars(parser.parse_args()))
     sys.exit(0)
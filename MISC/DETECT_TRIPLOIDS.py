@@ -9,20 +9,24 @@ Created on Sat Dec 19 14:18:44 2020
 import pickle, statistics, re, bz2, gzip
 from statistics import mean, variance
 from itertools import starmap
+from operator import itemgetter
 from math import log
 from collections import Counter, defaultdict
 
 HOME = '/home' #  '/Users' 
 
+COLUMN = {'MONOSOMY': 0, 'DISOMY': 1, 'SPH': 2, 'BPH': 3} #The position of each scenario in a tuple of likelihoods.
+
+#The data of chromosome length was taken from https://www.ncbi.nlm.nih.gov/grc/human/data?asm=GRCh38
+CHR_LENGTH = {'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259,
+              'chr6': 170805979, 'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422,
+              'chr11': 135086622, 'chr12': 133275309, 'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189,
+              'chr16': 90338345, 'chr17':  83257441, 'chr18': 80373285, 'chr19': 58617616, 'chr20': 64444167,
+              'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415}
+
 def chr_length(chr_id):
-    """ Return the chromosome length for a given chromosome, based on the reference genome hg38.""" 
-    #The data of chromosome length was taken from https://www.ncbi.nlm.nih.gov/grc/human/data?asm=GRCh38
-    length_dict = {'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259,
-                  'chr6': 170805979, 'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422,
-                  'chr11': 135086622, 'chr12': 133275309, 'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189,
-                  'chr16': 90338345, 'chr17':  83257441, 'chr18': 80373285, 'chr19': 58617616, 'chr20': 64444167,
-                  'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415}
-    return length_dict[chr_id]
+    """ Return the chromosome length for a given chromosome, based on the reference genome hg38."""
+    return CHR_LENGTH[chr_id]
 
 def std_of_mean(variances):
     """ Standard error of the mean of uncorrelated variables, based on the
@@ -49,6 +53,14 @@ def LLR(y,x):
         result = None    
     return result
 
+def LLRs_per_genomic_window(likelihoods, pairs):
+    """ Calculates the mean and variance of the LLRs in each genomic window
+        for every pair of scenarios. The likelihoods of the pair are fetched
+        by a single getter per pair, which is created once. """
+    getters = {(i,j): itemgetter(COLUMN[i],COLUMN[j]) for i,j in pairs}
+    return {pair: {window: mean_and_var([*starmap(LLR, map(get_pair, L))]) for window,L in likelihoods.items()}
+                for pair,get_pair in getters.items()}
+
 def load_likelihoods(filename):
     """ Loads from a file a dictionary that lists genomic windows that contain
     at least two reads and gives the bootstrap distribution of the 
@@ -156,14 +168,12 @@ def triple_plot(likelihoods,info,N,**kwargs):
     save = kwargs.get('save', '')
     pairs = {('BPH','DISOMY'):'saddlebrown', ('DISOMY','SPH'):'darkgreen', ('SPH','MONOSOMY'):'lightskyblue'}
 
-    _ = {};
-    LLRs_per_genomic_window = {(i,j): {window:  mean_and_var([*starmap(LLR, ((_[i], _[j]) for _['MONOSOMY'], _['DISOMY'], _['SPH'], _['BPH'] in L))])
-                       for window,L in likelihoods.items()} for i,j in pairs}
+    LLR_stats = LLRs_per_genomic_window(likelihoods, pairs)
     
     fig,(ax1)=plt.subplots(1,1)
     fig.set_size_inches(9, 6, forward=True)    
     
-    for p,LLR_stat in LLRs_per_genomic_window.items():
+    for p,LLR_stat in LLR_stats.items():
         X,Y,E,C = confidence(LLR_stat,N,z=1)
         T = [(x[1]+x[0])/2 for x in X]                
         ax1.plot([X[0][0]]+[i[1] for i in X[:-1] for j in (1,2)]+[X[-1][1]],[i for i in Y for j in (1,2)], label=f'LLR of {p[0]:s} to {p[1]:s}',color=pairs[p],linewidth=2)
@@ -201,7 +211,17 @@ def triple_plot(likelihoods,info,N,**kwargs):
        plt.tight_layout()
        plt.show()
  
+def confidence_per_pair(likelihoods,info,N,pairs):
+    """ Bins the LLRs of every pair of scenarios along a single chromosome,
+        without using matplotlib. """
+    return {p: confidence(LLR_stat,N,z=1) for (p,LLR_stat) in LLRs_per_genomic_window(likelihoods, pairs).items()}
+
 def panel_plot(DATA,N,**kwargs):
+    pairs = (('BPH','DISOMY'), ('DISOMY','SPH'), ('SPH','MONOSOMY'), ('BPH','SPH'))
+    
+    DATA = [*DATA]
+    CONFIDENCE = [confidence_per_pair(likelihoods,info,N,pairs) for likelihoods,info in DATA]
+    
     import matplotlib as mpl
     mpl.rcParams.update({'figure.max_open_warning': 0})
     import matplotlib.pyplot as plt
@@ -225,21 +245,12 @@ def panel_plot(DATA,N,**kwargs):
     #                  (False,False,True): (('SPH','BPH'),('SPH','MONOSOMY')),
     #                  (False,False,False): (('SPH','MONOSOMY'),)}
 
-    pairs = (('BPH','DISOMY'), ('DISOMY','SPH'), ('SPH','MONOSOMY'), ('BPH','SPH'))
-
     #default_classification = defaultdict(lambda: pairs, classification)
     
-    for ax1,(likelihoods,info) in zip(AX,DATA):
-        _ = {};
-        LLRs_per_genomic_window = {(i,j): {window:  mean_and_var([*starmap(LLR, ((_[i], _[j]) for _['MONOSOMY'], _['DISOMY'], _['SPH'], _['BPH'] in L))])
-                       for window,L in likelihoods.items()} for i,j in pairs}
-    
-        A = {p: confidence(LLR_stat,N,z=1) for (p,LLR_stat) in LLRs_per_genomic_window.items()}
+    for ax1,(likelihoods,info),A in zip(AX,DATA,CONFIDENCE):
         #key = (*(sum(A[p][1])>0 for p in pairs[:3]),) #2*sum(A[p][2])**.5
         for (a,b) in pairs: #default_classification[key]:
-            LLR_stat = {window:  mean_and_var([*starmap(LLR, ((_[a], _[b]) for _['MONOSOMY'], _['DISOMY'], _['SPH'], _['BPH'] in L))])
-                       for window,L in likelihoods.items()}
-            X,Y,E,C = confidence(LLR_stat,N,z=1)
+            X,Y,E,C = A[a,b] ### The LLRs of the pair were already calculated for all the pairs.
             T = [(x[1]+x[0])/2 for x in X]                
             ax1.plot([X[0][0]]+[i[1] for i in X[:-1] for j in (1,2)]+[X[-1][1]],[i for i in Y for j in (1,2)], label=f'LLR of {a:s} to {b:s}',color=colors[frozenset((a,b))], linewidth=2)
             ax1.errorbar(T, Y, yerr = E, ecolor='black',marker=None, ls='none',alpha=0.1) 
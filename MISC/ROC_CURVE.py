@@ -41,15 +41,16 @@ def LLR(y,x):
         result = None
     return result
 
+#The data of chromosome length was taken from https://www.ncbi.nlm.nih.gov/grc/human/data?asm=GRCh38
+CHR_LENGTH = {'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259,
+              'chr6': 170805979, 'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422,
+              'chr11': 135086622, 'chr12': 133275309, 'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189,
+              'chr16': 90338345, 'chr17':  83257441, 'chr18': 80373285, 'chr19': 58617616, 'chr20': 64444167,
+              'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415}
+
 def chr_length(chr_id):
     """ Return the chromosome length for a given chromosome, based on the reference genome hg38."""
-    #The data of chromosome length was taken from https://www.ncbi.nlm.nih.gov/grc/human/data?asm=GRCh38
-    length_dict = {'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259,
-                  'chr6': 170805979, 'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422,
-                  'chr11': 135086622, 'chr12': 133275309, 'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189,
-                  'chr16': 90338345, 'chr17':  83257441, 'chr18': 80373285, 'chr19': 58617616, 'chr20': 64444167,
-                  'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415}
-    return length_dict[chr_id]
+    return CHR_LENGTH[chr_id]
 
 def mean_and_var(sample):
     """ Calculates the mean and the sample standard deviation. """
@@ -261,10 +262,10 @@ def configuration(C):
 
 def main(RATIO,SP,matched,mixed,C,buckets_in_chr21):
     conf = configuration(C)
-    num_of_buckets = lambda n: {'chr'+str(i): n*chr_length('chr'+str(i))//chr_length('chr21') for i in [*range(1,23)]+['X','Y']}
+    num_of_buckets = {'chr'+str(i): buckets_in_chr21*chr_length('chr'+str(i))//chr_length('chr21') for i in [*range(1,23)]+['X','Y']}
     Z = [i/50 for i in [*range(-1800,-300,300)]+[*range(-300,300)]+[*range(300,1800,300)]  ]
-    DATA = collect_data(criterias = conf , num_of_buckets = num_of_buckets(buckets_in_chr21), ratio = RATIO, work_dir  = f'/mybox/simulations/results{mixed:s}_{SP:s}/')
-    R = prediction_rates(B = DATA[RATIO[0]], A = DATA[RATIO[1]], positive = 'both', thresholds = Z, num_of_buckets = num_of_buckets(buckets_in_chr21))
+    DATA = collect_data(criterias = conf , num_of_buckets = num_of_buckets, ratio = RATIO, work_dir  = f'/mybox/simulations/results{mixed:s}_{SP:s}/')
+    R = prediction_rates(B = DATA[RATIO[0]], A = DATA[RATIO[1]], positive = 'both', thresholds = Z, num_of_buckets = num_of_buckets)
     T = average_prediction_rates(R)
     N = {'chr'+str(i): {RATIO[0]: len(DATA[RATIO[0]]['chr'+str(i)]), RATIO[1]: len(DATA[RATIO[1]]['chr'+str(i)])} for i in [*range(1,23)]+['X','Y']}
     with open(f"data/PREDICTED_RATES_FOR_{RATIO[0]:s}_vs_{RATIO[1]:s}_{matched:s}_{SP:s}_{conf['depth']:g}x_{buckets_in_chr21:d}BUCKETS.p" , "wb") as f:
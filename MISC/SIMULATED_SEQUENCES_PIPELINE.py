@@ -8,53 +8,58 @@ Daniel Ariad (daniel@ariad.org)
 Dec 30, 2020
 
 """
-import time, sys, random, os, operator, collections
+import sys, random, os, operator, collections, multiprocessing
 
 from random import sample, choices, seed
-from multiprocessing import Process
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
 sys.path.append('../')
 from MIX_HAPLOIDS import MixHaploids_wrapper
-from EXTRACT_GENOTYPES import extract
+from EXTRACT_GENOTYPES import extract, load_panel_file, set_panel_semaphore
 
 leg_tuple = collections.namedtuple('leg_tuple', ('chr_id', 'pos', 'ref', 'alt')) #Encodes the rows of the legend table
 sam_tuple = collections.namedtuple('sam_tuple', ('sample_id', 'group1', 'group2', 'sex')) #Encodes the rows of the samples table
 obs_tuple = collections.namedtuple('obs_tuple', ('pos', 'read_id', 'base')) #Encodes the rows of the observations table
 
 
+@lru_cache(maxsize=None)
 def read_ref(filename):
+    """ Reads a list of samples. The lists never change during a run, so
+    each process reads every list once. """
     with open(filename, 'r') as data_in:
-        tab = tuple(str(line.replace('\n','')) for line in data_in)
+        tab = tuple(line.rstrip('\n') for line in data_in)
     return tab
 
 def runInParallel(*fns,**kwargs):
-    proc = []
-    for fn in fns:
-        try:
-            p = Process(target=fn,args=kwargs.get('args',tuple()))
-            p.start()
-            proc.append(p)
-            time.sleep(5)
-        except Exception as error:
-            print('caution: a process failed!')
-            print(error)
-    for p in proc:
-        try:
-          p.join()
-        except:
-            None
+    """ Runs the functions in a pool of processes, such that the number of
+    concurrent processes is bounded by the number of CPUs. Only the loading
+    of the reference panels from the disk is serialized, such that at most
+    'panel_loads' processes read them at the same time. """
+    semaphore = multiprocessing.Semaphore(kwargs.get('panel_loads',4))
+    with ProcessPoolExecutor(max_workers=kwargs.get('max_workers',None),
+                             initializer=set_panel_semaphore, initargs=(semaphore,)) as executor:
+        futures = [executor.submit(fn,*kwargs.get('args',tuple())) for fn in fns]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as error:
+                print('caution: a process failed!')
+                print(error)
+
+TRANSITIONS = {**{'chr%d' % i: 'BPH-SPH-BPH-SPH' for i in range(1,7)},
+               **{'chr%d' % i: 'BPH-SPH-BPH' for i in range(7,13)},
+               **{'chr%d' % i: 'SPH-BPH' for i in range(13,23)},
+               'chrX': 'SPH-BPH'} #The pattern of transitions per chromosome.
 
 def transitions(chr_id):
     """ Generates transitions between BPH to SPH regions for trisomy of meiosis II origin. """
-    x = int(chr_id[3:]) if chr_id[3:].isnumeric() else chr_id[3:]
-    if type(x) is int and 1<=x<=6:
-        #BPH-SPH-BPH-SPH
+    kind = TRANSITIONS.get(chr_id)
+    if kind=='BPH-SPH-BPH-SPH':
         result = ('BPH',random.uniform(0,.25),random.uniform(.5,.75),random.uniform(.75,1))
-    elif type(x) is int and 7<=x<=12:
-        #BPH-SPH-BPH
+    elif kind=='BPH-SPH-BPH':
         result = ('BPH',random.uniform(0,.333),random.uniform(.666,1))
-    elif x=='X' or (type(x) is int and 13<=x<=22):
-        #SPH-BPH
+    elif kind=='SPH-BPH':
         result = ('SPH',random.uniform(.5,1))
     else:
         result = ('SPH',1)
@@ -83,32 +88,44 @@ def aneuploidy_test_demo(obs_filename,chr_id,sp,model,min_reads,max_reads,output
     LLR_dict, info = aneuploidy_test(**args)
     return LLR_dict, info
 
-def simulate_haploids(sample_id,sp,chr_id,genotypes,output_dir):
-    """ Wraps the function 'extract'. """
+SPsorted = {('EUR_EAS'): 'EAS_EUR',
+            ('EAS_EUR'): 'EAS_EUR',
+            ('EUR_SAS'): 'SAS_EUR',
+            ('SAS_EUR'): 'SAS_EUR',
+            ('EAS_SAS'): 'EAS_SAS',
+            ('SAS_EAS'): 'EAS_SAS',
+            ('AFR_EUR'): 'AFR_EUR',
+            ('EUR_AFR'): 'AFR_EUR',
+            'EUR': 'EUR',
+            'EAS': 'EAS',
+            'SAS': 'SAS',
+            'AMR': 'AMR',
+            'AFR': 'AFR'} #Gives the reference panel of each population and pair of populations.
+
+def panel_filenames(sp,chr_id):
+    """ Returns the filenames of the legend, haplotypes and samples of a reference panel. """
     path = '../../reference_panels/'
     #path = f'../build_reference_panel/ref_panel.{sp:s}.hg38/'
     leg_filename = path + f'{sp:s}_panel.hg38/{chr_id:s}_{sp:s}_panel.legend.gz'
     hap_filename = path + f'{sp:s}_panel.hg38/{chr_id:s}_{sp:s}_panel.hap.gz'
     sam_filename = path + f'{sp:s}_panel.hg38/{sp:s}_panel.samples.gz'
+    return leg_filename, hap_filename, sam_filename
+
+def preload_panel(sp,chr_id):
+    """ Loads a reference panel into the cache of the parent process. On
+    Linux, the processes of the pool are forked from the parent and thus
+    share the loaded panel, instead of each of them parsing it again. """
+    for filename in panel_filenames(sp,chr_id):
+        load_panel_file(filename)
+
+def simulate_haploids(sample_id,sp,chr_id,genotypes,output_dir):
+    """ Wraps the function 'extract'. """
+    leg_filename, hap_filename, sam_filename = panel_filenames(sp,chr_id)
     return extract(leg_filename,hap_filename,sam_filename,chr_id,sample_id,genotypes=genotypes,output_dir=output_dir)
 
 def main(depth,sp,chr_id,read_length,min_reads,max_reads,work_dir,complex_admixture=False):
     work_dir = work_dir.rstrip('/') + '/' if len(work_dir)!=0 else ''
     #####################
-    SPsorted = {('EUR_EAS'): 'EAS_EUR',
-                ('EAS_EUR'): 'EAS_EUR',
-                ('EUR_SAS'): 'SAS_EUR',
-                ('SAS_EUR'): 'SAS_EUR',
-                ('EAS_SAS'): 'EAS_SAS',
-                ('SAS_EAS'): 'EAS_SAS',
-                ('AFR_EUR'): 'AFR_EUR',
-                ('EUR_AFR'): 'AFR_EUR',
-                'EUR': 'EUR',
-                'EAS': 'EAS',
-                'SAS': 'SAS',
-                'AMR': 'AMR',
-                'AFR': 'AFR'}
-    #####################
     seed(None, version=2)
     list_SP = sp.split('_')
 
@@ -164,6 +181,7 @@ if __name__ == "__main__":
     #main(depth,sp,chr_id,read_length,min_reads,max_reads,work_dir,complex_admixture)
         for sp in ('AFR_EUR','EAS_SAS','SAS_EUR','EAS_EUR'):
             work_dir = f"/mybox/F1-simulations/results_{sp:s}" #'../results' #'results_EAS'
+            preload_panel(SPsorted[sp],chr_id) ### The panel that the workers read.
             runInParallel(*([main]*32),args=(depth,sp,chr_id,read_length,min_reads,max_reads,work_dir,complex_admixture) )
     print('DONE.')
     pass
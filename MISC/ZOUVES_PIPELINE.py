@@ -8,8 +8,8 @@ Daniel Ariad (daniel@ariad.org)
 Nov 18, 2020
 
 """
-import time, re, pickle, os, sys
-from multiprocessing import Process
+import time, pickle, os, sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 sys.path.append('../')
 
@@ -60,39 +60,48 @@ if __name__ == "__main__":
     DONE = []
     ERRORS = []
     output_dir = '/home/ariad/Dropbox/postdoc_JHU/LD-PGTA_ecosystem/LD-PGTA_V2/results_ZOUVES/'
+    pool = ProcessPoolExecutor(max_workers=os.cpu_count()) #The processes are reused by all the cases, so the modules are imported once per process.
+    existing = set(os.listdir(output_dir)) #The output directory is listed once, rather than checking each file separately.
     for case in db_TEST:
         if case not in DONE:
             bam_filename = case['filename']
             print(case['filename'])
             sp = case['sp']
-            proc = []
+            basename = bam_filename.rsplit('/',1)[-1]
+            stem = basename[:-4] if basename.endswith('.bam') else basename #str.removesuffix requires Python 3.9.
+            futures = {}
             try:
                 for chr_num in case['chr_num']:
                     chr_id = 'chr'+str(chr_num)
-                    obs_filename = re.sub('.bam$','',bam_filename.split('/')[-1]) + f'.{chr_id:s}.obs.p.bz2'
-                    LLR_filename = re.sub('.bam$','',bam_filename.split('/')[-1]) + f'.{chr_id:s}.LLR.p.bz2'
-                    if not os.path.isfile(output_dir+obs_filename) or not CHECK:
+                    obs_filename = f'{stem:s}.{chr_id:s}.obs.p.bz2'
+                    LLR_filename = f'{stem:s}.{chr_id:s}.LLR.p.bz2'
+                    if obs_filename not in existing or not CHECK:
                         make_obs_tab_demo(case['filename'],chr_id, sp)
+                        existing.add(obs_filename)
                     else:
                         print(f'{obs_filename:s} already exists.')
 
-                    if not os.path.isfile(output_dir+LLR_filename) or not CHECK:
+                    if LLR_filename not in existing or not CHECK:
                         #aneuploidy_test_demo(obs_filename, chr_id, sp)
-                        p = Process(target=aneuploidy_test_demo,args=(obs_filename, chr_id, sp))
-                        p.start()
-                        proc.append(p)
+                        futures[pool.submit(aneuploidy_test_demo, obs_filename, chr_id, sp)] = LLR_filename
                     else:
                         print(f'{LLR_filename:s} already exists.')
             except Exception as error:
                 print('ERROR: ', error)
                 if os.path.isfile(output_dir+obs_filename): os.remove(output_dir+obs_filename)
                 if os.path.isfile(output_dir+LLR_filename): os.remove(output_dir+LLR_filename)
+                existing -= {obs_filename, LLR_filename}
                 ERRORS.append((bam_filename.strip().split('/')[-1],error))
 
-            for p in proc:
-                try: p.join()
-                except: None
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    existing.add(futures[future])
+                except Exception as error:
+                    print('ERROR: ', error)
+                    ERRORS.append((futures[future],error))
         DONE.append(bam_filename.strip().split('/')[-1])
+    pool.shutdown()
 
     print(ERRORS)
 else:
@@ -9,7 +9,7 @@ work_dir0 = '/home/ariad/Dropbox/postdoc_JHU/LD-PGTA_ecosystem/build_reference_p
 REF = {}
 for sp in ('EUR','AFR','SAS','EAS','AMR'):
     with open(work_dir0 + f'{sp:s}_panel.txt','rt') as f:
-        REF[sp] = [i.strip('\n') for i in f]
+        REF[sp] = frozenset(i.strip('\n') for i in f)
 
 def check(*x):
     for sp in ('EUR','AFR','SAS','EAS','AMR','ERROR'):
@@ -20,6 +20,9 @@ def check(*x):
     return sp
 
 import glob, shutil
+from concurrent.futures import ThreadPoolExecutor
+
+moves = [] ### Pairs of source and destination of files that are in the wrong directory.
 for sp in ('EUR','AFR','SAS','EAS','AMR'):
     work_dir = f'/mybox/simulations2/results_mixed_{sp:s}/'
     filenames = glob.glob(work_dir + '*.p.bz2')
@@ -28,38 +31,26 @@ for sp in ('EUR','AFR','SAS','EAS','AMR'):
         if a[1]=='monosomy':
             A = a[-4][:-1]
             sp1=check(A)
-            if sp1!=sp:
-                print(source)
-                dest = f'/mybox/simulations2/results_mixed_{sp1:s}/'+source.rpartition('/')[-1] 
-                shutil.move(source, dest)                
         elif a[1]=='SPH':
             A = a[-4][:-1]
             B = a[-5][:-1]
             sp1 = check(A,B)
-            if sp1!=sp:
-                print(source)
-                dest = f'/mybox/simulations2/results_mixed_{sp1:s}/'+source.rpartition('/')[-1] 
-                shutil.move(source, dest)                
         elif a[1]=='BPH':
             A = a[-4][:-1]
             B = a[-5][:-1]
             C = a[-6][:-1]
             sp1 = check(A,B,C)
-            if sp1!=sp:
-                print(source)
-                dest = f'/mybox/simulations2/results_mixed_{sp1:s}/'+source.rpartition('/')[-1] 
-                shutil.move(source, dest)                
         elif a[1]=='transitions':
             A = a[5][:-1]
             B = a[6][:-1]
             C = a[7][:-1]
             sp1 = check(A,B,C)
-            if sp1!=sp:
-                print(source)
-                dest = f'/mybox/simulations2/results_mixed_{sp1:s}/'+source.rpartition('/')[-1] 
-                shutil.move(source, dest)                
-        
-        
-        
-        
-    
\ No newline at end of file
+        else:
+            continue
+        if sp1!=sp:
+            print(source)
+            dest = f'/mybox/simulations2/results_mixed_{sp1:s}/'+source.rpartition('/')[-1] 
+            moves.append((source, dest))
+
+with ThreadPoolExecutor(max_workers=32) as executor: ### The moves are I/O-bound and thus are done by a pool of threads.
+    list(executor.map(lambda pair: shutil.move(*pair), moves))
@@ -18,9 +18,11 @@ for filename in filenames:
             obs_tab = pickle.load(f)
             info = pickle.load(f)
         
-        if len(obs_tab[0])==4:
-            obs_tab2 = tuple((a,c,d) for a,b,c,d in obs_tab)
+        if len(obs_tab[0])!=4:
+            print('already converted.') #Tables that were converted before are not compressed again.
+            continue
             
+        obs_tab2 = tuple((a,c,d) for a,b,c,d in obs_tab)
         
         with Open(filename, "wb") as f:
             pickle.dump(obs_tab2, f, protocol=4)
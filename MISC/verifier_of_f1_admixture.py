@@ -8,15 +8,24 @@
 
 from itertools import product
 from collections import defaultdict
+from functools import lru_cache
 from math import gcd as greatest_common_divisor
 from pickle import dump
 from time import time
 from bz2 import BZ2File
 import argparse, sys
 
+try:
+    from joblib import Memory
+    MEMORY = Memory('.model_cache', verbose=0) ### The models are also cached on disk, so they are not rebuilt in subsequent runs.
+except ModuleNotFoundError:
+    MEMORY = None
+    print('Caution: The module joblib is missing. The models would not be cached on disk.')
+
 def ENGINE(number_of_reads,degeneracies):
     """ Generates polysomy statistical models for n-reads, based of a list of
-    the degeneracy of each homolog. """
+    the degeneracy of each homolog. The models are cached, since the same
+    scenarios are built repeatedly, and thus should not be modified. """
 
     degeneracies_dict = {i:w for i,w in enumerate(degeneracies) if w>0}
     model = defaultdict(int)
@@ -30,30 +39,26 @@ def ENGINE(number_of_reads,degeneracies):
         model[key] += weight
     return model
 
+if MEMORY is not None:
+    ENGINE = MEMORY.cache(ENGINE)
+ENGINE = lru_cache(maxsize=None)(ENGINE)
+
 def representationA(model):
      """ Represents the model that is returned from the function ENGINE. """
-     result = ''
+     terms = []
      for partition,weight in model.items():
-        if result!='':
-            result += '+'
         l = [''.join((chr(read+65) for read in hap)) for hap in partition  if len(hap)] 
         sandwitch = ''.join(prefix+hap+')' for prefix,hap in zip(('g(','f(','f('),l))
-        if weight!=1:
-            result += f'{weight:d}'
-        result += f'{sandwitch:s}'
-     return result
+        terms.append(f'{weight:d}{sandwitch:s}' if weight!=1 else sandwitch)
+     return '+'.join(terms)
 
 def representationB(model):
     """ An alternative representation of the model. """
-    result = ''
+    terms = []
     for partition,weight in model.items():
-        if result!='':
-            result += '+'
         l = [''.join((chr(Aa+read_ind) for read_ind in hap)) for Aa,hap in zip((65,97,97),partition) if len(hap)] 
-        if weight!=1:
-            result += f'{weight:d}*'
-        result +=  f"{'*'.join(l):s}"
-    return result
+        terms.append(f"{weight:d}*{'*'.join(l):s}" if weight!=1 else '*'.join(l))
+    return '+'.join(terms)
 
 
 def BPH(number_of_reads):
@@ -8,86 +8,196 @@ Plots log-likelihood ratio vs. chromosomal position from a LLR file.
 May 20, 2020
 """
 
-import pickle, bz2, gzip, collections, math
-from statistics import mean, variance, median
+import pickle, bz2, gzip, io, collections, collections.abc, math
 from math import log
-from operator import attrgetter, itemgetter
-from itertools import accumulate
-import argparse, sys
+from itertools import chain
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import argparse, sys, os
+import numpy as np
 
 likelihoods_tuple = collections.namedtuple('likelihoods_tuple', ('monosomy', 'disomy', 'SPH', 'BPH'))
+LIKELIHOODS_DTYPE = np.dtype([(field, np.float64) for field in likelihoods_tuple._fields]) #Encodes the likelihoods of a bootstrap sample as a record of four doubles.
+
+OPENERS = {'bz2': bz2.open, 'gz': gzip.open, 'gzip': gzip.open} ### Opening methods according to the file extension.
+
+try:
+    import lz4.frame
+    OPENERS['lz4'] = lz4.frame.open
+except ModuleNotFoundError:
+    print('Caution: The module lz4 is missing. Files compressed via lz4 would not be supported.')
+
+try:
+    import zstandard
+    OPENERS['zst'] = zstandard.open
+except ModuleNotFoundError:
+    print('Caution: The module zstandard is missing. Files compressed via zstd would not be supported.')
+
+#The data of chromosome length was taken from https://www.ncbi.nlm.nih.gov/grc/human/data?asm=GRCh38
+CHR_LENGTH = {'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259,
+              'chr6': 170805979, 'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422,
+              'chr11': 135086622, 'chr12': 133275309, 'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189,
+              'chr16': 90338345, 'chr17':  83257441, 'chr18': 80373285, 'chr19': 58617616, 'chr20': 64444167,
+              'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415}
 
 def chr_length(chr_id):
-    """ Return the chromosome length for a given chromosome, based on the reference genome hg38.""" 
-    #The data of chromosome length was taken from https://www.ncbi.nlm.nih.gov/grc/human/data?asm=GRCh38
-    
-    length_dict = {'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259,
-                  'chr6': 170805979, 'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422,
-                  'chr11': 135086622, 'chr12': 133275309, 'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189,
-                  'chr16': 90338345, 'chr17':  83257441, 'chr18': 80373285, 'chr19': 58617616, 'chr20': 64444167,
-                  'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415}
-        
-    return length_dict[f'chr{chr_id:s}' if chr_id.isdigit() else chr_id]
+    """ Return the chromosome length for a given chromosome, based on the reference genome hg38."""
+    return CHR_LENGTH[f'chr{chr_id:s}' if chr_id.isdigit() else chr_id]
 
 def mean_and_var(x):
     """ Calculates the mean and variance. """
-    cache = tuple(x)
-    m = mean(cache)
-    var = variance(cache, xbar=m)
-    return m, var
+    if type(x)!=np.ndarray:
+        x = np.fromiter(x, dtype=np.float64)
+    return float(x.mean()), float(x.var(ddof=1)) ### The sample variance is calculated in two passes, as in statistics.variance.
 
 def mean_and_std_of_mean_of_rnd_var(A):
     """ Calculates the mean and sample standard deviation of the mean of random variables.
         Each row of A represents a random variable, with observations in the columns."""
     if type(A)==dict:
-        A = tuple(tuple(i) for i in A.values()) 
-    
-    M, N = len(A), len(A[0]) ### M is the number of random variables, while N is the number of samples.
-    mu = sum(sum(likelihoods_in_window) for likelihoods_in_window in A) / N
-    arg = ((sum(sampled_likelihoods) - mu)**2 for sampled_likelihoods in zip(*A))
-    std = (sum(arg) / (N - 1))**.5 / M
+        A = [*A.values()]
+    if type(A)!=np.ndarray:
+        N = min(map(len, A)) ### Rows are truncated to the smallest number of observations.
+        A = np.array([a[:N] for a in A], dtype=np.float64)
+
+    M, N = A.shape ### M is the number of random variables, while N is the number of samples.
+    col_sums = A.sum(axis=0)
+    mu = col_sums.sum() / N
+    std = np.sqrt(((col_sums - mu)**2).sum() / (N - 1)) / M
     mean = mu / M
-    return mean, std
+    return float(mean), float(std)
 
 def median_and_mad_of_mean_of_rnd_var(A):
     """ Calculates the median of GW's mean and median absolute deviation of the GW's mean.
         Each row of A corresponds to a random variable/genomic window, while each column 
         corresponds to a different observation/sample. """
     if type(A)==dict:
-        A = tuple(tuple(i) for i in A.values()) 
-    
-    M, N = len(A), len(A[0]) ### M is the number of random variables, while N is the number of samples.
-    m = median(sum(sampled_likelihoods) for sampled_likelihoods in zip(*A))
-    mad = median(abs(sum(sampled_likelihoods) - m) for sampled_likelihoods in zip(*A)) 
+        A = [*A.values()]
+    if type(A)!=np.ndarray:
+        N = min(map(len, A)) ### Rows are truncated to the smallest number of observations.
+        A = np.array([a[:N] for a in A], dtype=np.float64)
+
+    M, N = A.shape ### M is the number of random variables, while N is the number of samples.
+    col_sums = A.sum(axis=0)
+    m = np.median(col_sums)
+    mad = np.median(np.abs(col_sums - m))
     mu = m / M
     adjust_mad =  mad / ( 0.6744897501960817 * M) 
-    return mu, adjust_mad
+    return float(mu), float(adjust_mad)
 
 def LLR(y,x):
     """ Calculates the logarithm of y over x and deals with edge cases. """
+    ### The cases are exclusive, thus each edge case tests a single condition and the function returns at once.
     if x and y:
-        result = log(y/x)
-    elif x and not y:
-        result = -1.23456789 
-    elif not x and y:
-        result = +1.23456789 
-    elif not x and not y:
-        result = 0 
+        return log(y/x)
+    elif x:
+        return -1.23456789
+    elif y:
+        return +1.23456789
     else:
-        result = None    
-    return result
+        return 0
+
+def LLRs_per_window(likelihoods, pair):
+    """ Calculates the LLRs between a pair of scenarios for the bootstrap
+    samples of all the genomic windows at once. The edge cases are dealt with
+    as in the function LLR. Returns a dictionary that lists the genomic
+    windows and gives the LLRs of their samples as views of a single array. """
+
+    i, j = map(likelihoods_tuple._fields.index, pair)
+    if type(likelihoods)!=likelihoods_array:
+        likelihoods = stack_likelihoods(likelihoods)
+    lengths, A = likelihoods.lengths.tolist(), likelihoods.array
+    y, x = A[:,i], A[:,j]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.log(y / x)
+    result[(x!=0) & (y==0)] = -1.23456789
+    result[(x==0) & (y!=0)] = +1.23456789
+    result[(x==0) & (y==0)] = 0
+    return dict(zip(likelihoods, np.split(result, np.cumsum(lengths[:-1]))))
+
+class likelihoods_array(collections.abc.Mapping):
+    """ A read-only dictionary of likelihoods that is backed by NumPy arrays.
+    The likelihoods of a genomic window are given as a structured array of
+    LIKELIHOODS_DTYPE, which is a view of the stacked likelihoods. Thus, the
+    likelihoods of a scenario are accessed by its name, e.g., L['BPH'], and
+    each bootstrap sample can still be unpacked like a likelihoods_tuple. """
+
+    def __init__(self, windows, lengths, array):
+        self.windows = tuple(map(tuple, windows.tolist()))
+        self.lengths = lengths
+        self.array = array
+        self.offsets = dict(zip(self.windows, zip(np.cumsum(lengths).tolist(), lengths.tolist())))
+
+    def __getitem__(self, window):
+        end, length = self.offsets[window]
+        return self.array[end-length:end].view(LIKELIHOODS_DTYPE).reshape(-1)
+
+    def __iter__(self):
+        return iter(self.windows)
+
+    def __len__(self):
+        return len(self.windows)
+
+def stack_likelihoods(likelihoods):
+    """ Stacks the likelihoods of all the bootstrap samples of all the genomic
+    windows into a single array of four columns, which is wrapped by the class
+    likelihoods_array. """
+
+    lengths = np.fromiter(map(len, likelihoods.values()), dtype=np.int64, count=len(likelihoods))
+    array = np.fromiter(chain.from_iterable(chain.from_iterable(likelihoods.values())),
+                        dtype=np.float64, count=4*int(lengths.sum())).reshape(-1, 4)
+    windows = np.array([*likelihoods], dtype=np.int64).reshape(-1, 2)
+    return likelihoods_array(windows, lengths, array)
+
+def save_likelihoods_npz(filename, likelihoods, info):
+    """ Saves the likelihoods together with the information about them into
+    a compressed NumPy archive. The genomic windows, the number of bootstrap
+    samples per window and the likelihoods of all the samples are stored as
+    arrays, which are loaded much faster than the pickled dictionary. An LLR
+    file can be converted by save_likelihoods_npz(filename, *load_likelihoods(llr_filename)). """
+
+    if type(likelihoods)!=likelihoods_array:
+        likelihoods = stack_likelihoods(likelihoods)
+    np.savez_compressed(filename,
+                        windows=np.array(likelihoods.windows, dtype=np.int64).reshape(-1, 2),
+                        lengths=likelihoods.lengths,
+                        likelihoods=likelihoods.array,
+                        info=np.frombuffer(pickle.dumps(info, protocol=4), dtype=np.uint8))
+    return 0
 
 def load_likelihoods(filename):
     """ Loads from a file a dictionary that lists genomic windows that contain
     at least two reads and gives the bootstrap distribution of the 
-    log-likelihood ratios (LLRs). """
+    log-likelihood ratios (LLRs). NumPy archives that were created by
+    save_likelihoods_npz are also supported. In both cases, the dictionary is
+    returned as a likelihoods_array. Files are cached as long as they are not
+    modified, and thus the returned objects should not be modified. """
+    
+    return load_likelihoods_of_version(filename, os.path.getmtime(filename))
+
+@lru_cache(maxsize=32)
+def load_likelihoods_of_version(filename, mtime):
+    """ Loads an LLR file, where the time of the last modification of the
+    file is a part of the key of the cache. """
     
-    Open = {'bz2': bz2.open, 'gzip': gzip.open}.get(filename.rpartition('.')[-1], open)
+    ext = filename.rpartition('.')[-1]
     
-    with Open(filename, 'rb') as f:
+    if ext=='npz':
+        with np.load(filename) as data:
+            likelihoods = likelihoods_array(data['windows'], data['lengths'], data['likelihoods'])
+            info = pickle.loads(data['info'].tobytes())
+        return likelihoods, info
+    
+    if ext=='bz2': ### Decompressing the whole file in a single call is faster than streaming it to the unpickler.
+        with open(filename, 'rb') as raw:
+            f = io.BytesIO(bz2.decompress(raw.read()))
+    else:
+        Open = OPENERS.get(ext, open)
+        f = io.BufferedReader(Open(filename, 'rb'), buffer_size=1<<20) ### The unpickler issues many small reads, which are served from the buffer.
+    
+    with f:
         likelihoods = pickle.load(f)
         info = pickle.load(f)
-    return likelihoods, info
+    return stack_likelihoods(likelihoods), info ### The likelihoods are stacked once, rather than for every pair of scenarios.
 
 def show_info(filename, info, pairs=(('BPH','SPH'),)):
     S = info['statistics']
@@ -110,43 +220,54 @@ def show_info(filename, info, pairs=(('BPH','SPH'),)):
             print(f"Fraction of genomic windows with a negative LLR: {L['fraction_of_negative_LLRs']:.3f}")
 
 def bin_genomic_windows(windows,chr_id,num_of_bins):
-    """ Lists the bins and gives the genomic windows that they contain. """
+    """ Lists the bins and gives the genomic windows that they contain. The
+    genomic windows are sorted by their position along the chromosome, so the
+    boundaries of all the bins are located among the midpoints of the windows
+    by a single binary search. """
     bin_size = chr_length(chr_id) / num_of_bins
-    result = {}
-    j = 0
-    
-    for i in range(num_of_bins): ### All bins before the first the genomic window are filled with Nones.
-        if sum(windows[0])/2 < (i+1)*bin_size:
-            break
-        result[i/num_of_bins,(i+1)/num_of_bins] = None
-    
-    for k,(a,b) in enumerate(windows):
-        if not bin_size*i <= (a+b)/2 < bin_size*(i+1):
-            result[i/num_of_bins,(i+1)/num_of_bins] = (j,k)
-            j = k
-            for i in range(i+1,num_of_bins): #Proceed to the next non-empty bin; Empty bins are filled with Nones.
-                if (a+b)/2 < (i+1)*bin_size:
-                    break
-                result[i/num_of_bins,(i+1)/num_of_bins] = None
-    
-    for i in range(i,num_of_bins): ### All bins after the last the genomic window are filled with Nones.
-        result[i/num_of_bins,(i+1)/num_of_bins] = (j,k) if j != k else None
-        j = k 
+    edges = np.arange(num_of_bins+1) * bin_size ### The i-th bin spans the interval [edges[i], edges[i+1]).
+    midpoints = np.asarray(windows, dtype=np.int64).reshape(-1,2).sum(axis=1) / 2
+    idx = np.searchsorted(midpoints, edges).tolist()
+    result = {(i/num_of_bins,(i+1)/num_of_bins): (idx[i],idx[i+1]) if idx[i]!=idx[i+1] else None for i in range(num_of_bins)} ### Empty bins are filled with Nones.
     return result
 
-def binning(LLRs_per_window,info,num_of_bins):
+def binned_mean_and_std(A, bounds):
+    """ For each bin, calculates the mean and sample standard deviation of the
+        mean of the random variables in the rows bounds[k,0] to bounds[k,1] of
+        A. The bins are sorted and non-overlapping. """
+    if len(bounds)==0:
+        return np.empty(0), np.empty(0)
+    M, N = bounds[:,1] - bounds[:,0], A.shape[1]
+    indices = bounds.ravel()
+    if indices[-1]==len(A): indices = indices[:-1] ### The last segment of reduceat extends to the end of A.
+    col_sums = np.add.reduceat(A, indices, axis=0)[::2] ### Odd segments lie between the bins.
+    mu = col_sums.sum(axis=1) / N
+    std = np.sqrt(((col_sums - mu[:,None])**2).sum(axis=1) / (N - 1)) / M
+    return mu / M, std
+
+def binning(LLRs_per_window,info,num_of_bins,bins=None):
     """ Genomic windows are distributed into bins. The LLRs in a genomic windows
     are regarded as samples of a random variable. Within each bin, we calculate
     the mean and population standard deviation of the mean of random variables. 
     The boundaries of the bins as well as the mean LLR and the standard-error
-    per bin are returned. """
+    per bin are returned. The bins, as given by bin_genomic_windows, may be
+    passed on when the same genomic windows are binned more than once. """
              
     #K,M,V = tuple(LLR_stat.keys()), *zip(*LLR_stat.values())
-    list_of_windows = [*LLRs_per_window.keys()]
-    bins = bin_genomic_windows(list_of_windows, info['chr_id'], num_of_bins)
+    if bins is None:
+        list_of_windows = [*LLRs_per_window.keys()]
+        bins = bin_genomic_windows(list_of_windows, info['chr_id'], num_of_bins)
     X = [*bins]
     
     LLR_matrix = [*LLRs_per_window.values()]
+    if len({*map(len, LLR_matrix)})==1: ### When all the windows have the same number of samples, all the bins are processed in a single pass.
+        nonempty = [i for i,C in enumerate(bins.values()) if C]
+        bounds = np.array([C for C in bins.values() if C], dtype=np.int64).reshape(-1,2)
+        Y, E = [None]*num_of_bins, [None]*num_of_bins
+        for i, mean, std in zip(nonempty, *binned_mean_and_std(np.array(LLR_matrix, dtype=np.float64), bounds)):
+            Y[i], E[i] = float(mean), float(std)
+        return X,Y,E
+    
     Y, E = [], []
     for C in bins.values():
         if C:
@@ -160,79 +281,157 @@ def binning(LLRs_per_window,info,num_of_bins):
     
     return X,Y,E
 
+def scan_for_extrema(acc_means, acc_vars, z_score, lookahead):
+    """ Scans the accumulated mean and variance of the LLRs in the 5'-to-3'
+        direction to find the extrema that indicate crossovers. For each
+        extremum, in the order of detection, returns its index, the index of
+        the previous extremum, its kappa, its type (+1 for a maximum and -1 for
+        a minimum) and whether a skipped extremum of the opposite type precedes
+        it. """
+    
+    n = len(acc_means)
+    indices, previous, kappas = np.empty(n, dtype=np.int64), np.empty(n, dtype=np.int64), np.empty(n, dtype=np.float64)
+    types, skipped = np.empty(n, dtype=np.int64), np.empty(n, dtype=np.bool_)
+    k = 0
+    
+    #Maxima and minima candidates are temporarily stored in mx and mn, respectively.
+    has_mx, has_mn, last_ind, last_extremum = False, False, 0, 0
+    mx_index, mx, mx_var, mn_index, mn, mn_var = 0, 0.0, 0.0, 0, 0.0, 0.0
+    
+    #The backward scan depends only on the candidate and on last_ind, thus a candidate that failed it is not scanned again.
+    mx_failed, mn_failed = -1, -1
+        
+    for index in range(n):
+        y, v = acc_means[index], acc_vars[index]
+        
+        if  not has_mx or y > mx:
+            mx_index, mx, mx_var, has_mx = index, y, v, True
+        
+        if  not has_mn or y < mn:
+            mn_index, mn, mn_var, has_mn = index, y, v, True
+
+        if has_mx and mx_index!=mx_failed and 0 < (mx-y)-z_score*(v-mx_var)**.5 and index-mx_index>=lookahead: #maximum point detected
+            mx_failed = mx_index
+            for j in range(max(mx_index-lookahead,last_ind),last_ind,-1):
+                y2, v2 = acc_means[j], acc_vars[j]
+                if 0 < (mx-y2)-z_score*(mx_var-v2)**.5:
+                    indices[k], previous[k], types[k], skipped[k] = mx_index, last_ind, +1, last_extremum == +1 #A skipped minimum point would be recovered.
+                    kappas[k] = min((mx-y2)/(mx_var-v2)**.5,(mx-y)/(v-mx_var)**.5)
+                    k += 1
+                    has_mx, has_mn, last_ind, last_extremum = False, False, mx_index, +1 # set algorithm to find the next minimum
+                    break
+                
+        if has_mn and mn_index!=mn_failed and 0 < (y-mn)-z_score*(v-mn_var)**.5  and index-mn_index>=lookahead: #minimum point detected
+            mn_failed = mn_index
+            for j in range(max(mn_index-lookahead,last_ind),last_ind,-1):
+                y2, v2 = acc_means[j], acc_vars[j]
+                if  0 < (y2-mn)-z_score*(mn_var-v2)**.5:
+                    indices[k], previous[k], types[k], skipped[k] = mn_index, last_ind, -1, last_extremum == -1 #A skipped maximum point would be recovered.
+                    kappas[k] = min((y2-mn)/(mn_var-v2)**.5,(y-mn)/(v-mn_var)**.5)
+                    k += 1
+                    has_mx, has_mn, last_ind, last_extremum = False, False, mn_index, -1 # set algorithm to find the next maxima
+                    break
+                
+    return indices[:k], previous[:k], kappas[:k], types[:k], skipped[:k]
+
+try:
+    from numba import njit
+    ### An explicit signature compiles the function at import, such that the forked workers never compile it again.
+    scan_for_extrema = njit('Tuple((int64[:], int64[:], float64[:], int64[:], boolean[:]))(float64[:], float64[:], float64, int64)')(scan_for_extrema)
+except ModuleNotFoundError:
+    print('Caution: The module numba is missing. Crossovers would be detected via pure Python instead.')
+    scan_arrays_for_extrema = scan_for_extrema
+    def scan_for_extrema(acc_means, acc_vars, z_score, lookahead):
+        ### Indexing lists in pure Python is considerably faster than indexing NumPy arrays.
+        return scan_arrays_for_extrema(acc_means.tolist(), acc_vars.tolist(), z_score, lookahead)
+
 def detect_crossovers_v2(genomic_windows, mean_of_LLRs, variance_of_LLRs, z_score=1.96, lookahead=20):
     """ Detecting crossovers by indetifying transitions between BPH and SPH 
         regions. """
         
     crossovers = {}
-    #Scan the chromosome in the 5'-to-3' direction to find crossovers.
     x_coord = tuple(0.5*(a+b) for a,b in genomic_windows)
-    acc_means = tuple(accumulate(mean_of_LLRs))
-    acc_vars = tuple(accumulate(variance_of_LLRs))
-    triple = tuple(zip(x_coord, acc_means, acc_vars))
+    acc_means = np.cumsum(np.asarray(mean_of_LLRs, dtype=np.float64))
+    acc_vars = np.cumsum(np.asarray(variance_of_LLRs, dtype=np.float64))
     
-    #Maxima and minima candidates are temporarily stored in mx and mn, respectively.
-    mx, mn, last_ind, last_extremum = None, None, 0, 0
-        
     def recover_skipped_extremum(extremum_type,last_ind,ind):
         """ Recovers skipped extremum """
         ### extremum_typ is the max (minimum) function if a maximum (minimum) was skipped.
         ### last_ind is the index of the last detected extremum.
         ### ind is the index of the most recent detected extremum.
-        M0, M2, V0, V2 = acc_means[last_ind],acc_means[ind], acc_vars[last_ind], acc_vars[ind]
-        Z1, X1, M1, V1 = extremum_type((((M1-M0)/(V1-V0)**.5-(M2-M1)/(V2-V1)**.5, X1, M1, V1) 
-                              for X1,M1,V1 in triple[last_ind+5:ind-4] if V0!=V1!=V2), key=itemgetter(0))
+        M0, M2, V0, V2 = acc_means[last_ind].item(), acc_means[ind].item(), acc_vars[last_ind].item(), acc_vars[ind].item()
+        M, V = acc_means[last_ind+5:ind-4], acc_vars[last_ind+5:ind-4]
+        candidates = np.flatnonzero((V0!=V) & (V!=V2))
+        Z = (M[candidates]-M0)/(V[candidates]-V0)**.5-(M2-M[candidates])/(V2-V[candidates])**.5 ### The scores of all the candidates are calculated at once.
+        k = Z.argmax() if extremum_type is max else Z.argmin() ### As the builtins max and min, the first extremum is taken.
+        Z1, X1, M1, V1 = Z[k].item(), x_coord[last_ind+5:ind-4][candidates[k]], M[candidates[k]].item(), V[candidates[k]].item()
         kappa = min(abs(M2-M1)/(V2-V1)**.5,abs(M0-M1)/(V1-V0)**.5)
         print(f'Recovering skipped {extremum_type.__name__:s} point:',(Z1, X1, M1, V1))
         return {X1: kappa}
-        
-    for index, (x, y, v) in enumerate(triple):
-        
-        if  mx==None or y > mx:
-            mx_index,mx_pos,mx,mx_var = index,x,y,v
-        
-        if  mn==None or y < mn:
-            mn_index,mn_pos,mn,mn_var = index,x,y,v
-
-        if mx!=None and 0 < (mx-y)-z_score*(v-mx_var)**.5 and index-mx_index>=lookahead: #maximum point detected
-            for x2, y2, v2 in triple[max(mx_index-lookahead,last_ind):last_ind:-1]:
-                if 0 < (mx-y2)-z_score*(mx_var-v2)**.5:
-                   
-                    if last_extremum == +1: #Recovering skipped minimum point.
-                        crossovers.update(recover_skipped_extremum(min,last_ind,mx_index)) 
-
-                    kappa = min((mx-y2)/(mx_var-v2)**.5,(mx-y)/(v-mx_var)**.5)
-                    crossovers[mx_pos] = kappa
-                    mx, mn, last_ind, last_extremum = None, None, mx_index, +1 # set algorithm to find the next minimum
-                    break
-                
-        if mn!=None and 0 < (y-mn)-z_score*(v-mn_var)**.5  and index-mn_index>=lookahead: #minimum point detected
-            for x2, y2, v2 in triple[max(mn_index-lookahead,last_ind):last_ind:-1]:
-                if  0 < (y2-mn)-z_score*(mn_var-v2)**.5:
-                    
-                    if last_extremum == -1: #Recovering skipped maximum point.
-                        crossovers.update(recover_skipped_extremum(max,last_ind,mn_index))
-                        
-                    kappa = min((y2-mn)/(mn_var-v2)**.5,(y-mn)/(v-mn_var)**.5)
-                    crossovers[mn_pos] = kappa
-                    
-                    mx, mn, last_ind, last_extremum = None, None, mn_index, -1 # set algorithm to find the next maxima
-                    break
+    
+    #Scan the chromosome in the 5'-to-3' direction to find crossovers.
+    events = scan_for_extrema(acc_means, acc_vars, float(z_score), int(lookahead))
+    
+    for index, last_ind, kappa, extremum, skipped in zip(*map(np.ndarray.tolist, events)):
+        if skipped: 
+            crossovers.update(recover_skipped_extremum(min if extremum==+1 else max,last_ind,index)) 
+        crossovers[x_coord[index]] = kappa
                 
     return crossovers
 
+def interactive(save):
+    """ Tells whether a figure would be shown in a window. Otherwise, the
+    non-interactive backend Agg is used, such that no GUI toolkit is loaded,
+    i.e., when the figure is saved or when no display is available. """
+    headless = sys.platform.startswith('linux') and not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    if save=='' and headless:
+        print('Caution: No display is available, thus the figure would not be shown. Use the argument save to store it in a file.')
+    return save=='' and not headless
+
 def capitalize(x):
     return x[0].upper() + x[1:]
     
+def traces_of_subplot(likelihoods, info, pairs, bin_size, z_score, lookahead):
+    """ Calculates the traces that are depicted in a subplot of the panel,
+    without using matplotlib. For each pair of scenarios, the coordinates of
+    the step plot and of the error bars are returned. In addition, when the
+    only pair is BPH and SPH, the normalized positions of the crossovers are
+    returned. """
+
+    num_of_bins = chr_length(info['chr_id'])//bin_size
+    genomic_bins = bin_genomic_windows([*likelihoods], info['chr_id'], num_of_bins) ### The genomic windows are binned once for all the pairs of scenarios.
+    traces, bins = {}, None
+    for a,b in pairs:
+        LLRs = LLRs_per_window(likelihoods, (a,b))
+
+        X,Y,E = binning(LLRs,info,num_of_bins,genomic_bins)
+        Y = np.nan_to_num(np.array(Y, dtype=np.float64)) ### Empty bins are given as None, which is converted to NaN and then to zero.
+        E = z_score * np.nan_to_num(np.array(E, dtype=np.float64))
+        
+        if bins is None: ### The bins are the same for all the pairs of scenarios, and thus their coordinates are shared.
+            bins = np.array(X, dtype=np.float64)
+            T = bins.mean(axis=1)
+            P = (bins[:,1]-bins[:,0])/2
+            steps_x = np.concatenate((bins[:1,0], np.repeat(bins[:-1,1], 2), bins[-1:,1]))
+        steps_y = np.repeat(Y, 2)
+        traces[a,b] = (steps_x, steps_y, T, Y, P, E)
+        
+    if pairs==(('BPH','SPH'),) or pairs==(('SPH','BPH'),):
+        genomic_windows = info['statistics']['LLRs_per_genomic_window'][('BPH','SPH')]
+        mean_of_LLRs, variance_of_LLRs = np.fromiter(chain.from_iterable(genomic_windows.values()), dtype=np.float64, count=2*len(genomic_windows)).reshape(-1,2).T ### Passed on to np.cumsum without intermediate lists.
+        unnormalized_crossovers = detect_crossovers_v2(genomic_windows, mean_of_LLRs, variance_of_LLRs, z_score=z_score, lookahead=lookahead)
+        l = chr_length(info['chr_id'])
+        crossovers = np.fromiter(unnormalized_crossovers, dtype=np.float64, count=len(unnormalized_crossovers)) / l #Normalize position according to the chromosome length.
+    else:
+        crossovers = None
+    
+    return traces, crossovers
+
 def panel_plot(DATA,**kwargs):
     """ Creates a multi-panel figure. For each numbered chromosome, a figure 
         depicts the log-likelihood ratio vs. chromosomal position for BPH over
         SPH. """
     
-    import matplotlib as mpl
-    mpl.rcParams.update({'figure.max_open_warning': 0})
-    
-    
     scale = kwargs.get('scale', 0.5)
     save = kwargs.get('save', '')
     z_score = kwargs.get('z_score', 1.96)
@@ -241,19 +440,30 @@ def panel_plot(DATA,**kwargs):
     bin_size = kwargs.get('bin_size', 4000000)
     pairs = kwargs.get('pairs', (('BPH','disomy'),('disomy','SPH'),('SPH','monosomy')))
     
+    show = interactive(save)
+    if save=='' and not show: ### Nothing is calculated when the figure would be neither saved nor shown.
+        return
+    
+    SUBPLOTS = [traces_of_subplot(likelihoods, info, pairs, bin_size, z_score, lookahead) for likelihoods, info in DATA.values()]
+    TRACES = [traces for traces, crossovers in SUBPLOTS]
+    CROSSOVERS = [crossovers for traces, crossovers in SUBPLOTS]
+    
+    import matplotlib as mpl
+    mpl.rcParams.update({'figure.max_open_warning': 0})
+    
     fs=28 * scale
     columns = 6
     rows = math.ceil(len(DATA)/columns)
         
-    if save!='':
-            mpl.use('Agg')
-    else:
+    if show:
         #['GTK3Agg', 'GTK3Cairo', 'MacOSX', 'nbAgg', 'Qt4Agg', 'Qt4Cairo', 'Qt5Agg', 'Qt5Cairo', 'TkAgg', 'TkCairo', 'WebAgg', 'WX', 'WXAgg', 'WXCairo', 'agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template']
         mpl.use('Qt5Agg')
+    else:
+        mpl.use('Agg') ### No GUI toolkit is loaded.
     
     
     import matplotlib.pyplot as plt
-    num_of_bins = {info['chr_id']: chr_length(info['chr_id'])//bin_size for (likelihoods,info) in DATA.values()}
+    from matplotlib.collections import LineCollection
 
     colors = {frozenset(('BPH','disomy')):(177/255,122/255,162/255),
               frozenset(('disomy','SPH')):(242/255,142/255,44/255),
@@ -273,37 +483,16 @@ def panel_plot(DATA,**kwargs):
     
     H = {}
     YMAX = [0]*len(DATA)
-    crossovers = {}
     for a,b in pairs:
-        for g,(ax1,(likelihoods,info)) in enumerate(zip(AX,DATA.values())):
-    
-
-            LLRs = {window: tuple(LLR(attrgetter(a)(l), attrgetter(b)(l)) for l in likelihoods_in_window)
-                               for window,likelihoods_in_window in likelihoods.items()} 
-                                                               
-            X,Y,E = binning(LLRs,info,num_of_bins[info['chr_id']])
-            Y = [(y if y else 0) for y in Y]
-            E = [(z_score*e if e else 0) for e in E]
-            
-            T = [(x[1]+x[0])/2 for x in X]                
-            steps_x = [X[0][0]]+[i[1] for i in X[:-1] for j in (1,2)]+[X[-1][1]]
-            steps_y = [i for i in Y for j in (1,2)]
-            H[a,b] = ax1.plot(steps_x, steps_y, label=f'{capitalize(a):s} vs. {capitalize(b):s}' ,color=colors[frozenset((a,b))], linewidth=2, zorder=10, scalex=True, scaley=True, alpha=0.8)
-            
-            P = [(x[1]-x[0])/2 for x in X]                
-            ax1.errorbar(T, Y, xerr = P, ecolor=colors[frozenset((a,b))],marker=None, ls='none',alpha=1, zorder=13, linewidth=5*scale) 
-            ax1.errorbar(T, Y, yerr = E, ecolor='black',marker=None, ls='none',alpha=0.2, zorder=15, linewidth=4*scale) 
+        color = colors[frozenset((a,b))]
+        for g,(ax1,traces) in enumerate(zip(AX,TRACES)):
+            steps_x, steps_y, T, Y, P, E = traces[a,b]
+            H[a,b] = ax1.plot(steps_x, steps_y, label=f'{capitalize(a):s} vs. {capitalize(b):s}' ,color=color, linewidth=2, zorder=10, scalex=True, scaley=True, alpha=0.8)
+            ### The error bars of all the bins are drawn as two collections of segments, rather than through errorbar.
+            ax1.add_collection(LineCollection(np.stack((T-P, Y, T+P, Y), axis=-1).reshape(-1,2,2), colors=[color], alpha=1, zorder=13, linewidths=5*scale))
+            ax1.add_collection(LineCollection(np.stack((T, Y-E, T, Y+E), axis=-1).reshape(-1,2,2), colors='black', alpha=0.2, zorder=15, linewidths=4*scale))
             
-            yabsmax = max(map(abs,Y))
-            
-            if pairs==(('BPH','SPH'),) or pairs==(('SPH','BPH'),):
-                genomic_windows = info['statistics']['LLRs_per_genomic_window'][('BPH','SPH')]
-                mean_of_LLRs = [*map(itemgetter(0),genomic_windows.values())]
-                variance_of_LLRs = [*map(itemgetter(1),genomic_windows.values())]
-                unnormalized_crossovers = detect_crossovers_v2(genomic_windows, mean_of_LLRs, variance_of_LLRs, z_score=z_score, lookahead=lookahead)
-                l = chr_length(info['chr_id'])
-                crossovers[g] = [pos/l for pos in unnormalized_crossovers] #Normalize position according to the chromosome length.
-                
+            yabsmax = float(np.abs(Y).max())
             YMAX[g] = yabsmax if YMAX[g]< yabsmax else YMAX[g]
 
     for g,(ax1,(identifier,(likelihoods,info))) in enumerate(zip(AX,DATA.items())):
@@ -334,8 +523,7 @@ def panel_plot(DATA,**kwargs):
             ax1.spines[axis].set_linewidth(2*scale)
             
         if pairs==(('BPH','SPH'),) or pairs==(('SPH','BPH'),):
-            for i in crossovers[g]:
-                ax1.plot([i,i],[-1.01*ymax,1.01*ymax],color='purple', ls='dotted',alpha=0.7,zorder=19, linewidth=2*scale, scalex=False, scaley=False)
+            ax1.vlines(CROSSOVERS[g],-1.01*ymax,1.01*ymax,color='purple', ls='dotted',alpha=0.7,zorder=19, linewidth=2*scale) ### A single collection for all the crossovers.
 
     fig.add_subplot(111, frameon=False)
     plt.tick_params(labelcolor='none', top=False, bottom=False, left=False, right=False)
@@ -379,11 +567,15 @@ def single_plot(likelihoods,info,**kwargs):
     save = kwargs.get('save', '')
     pairs = kwargs.get('pairs', (('BPH','disomy'),('disomy','SPH'),('SPH','monosomy')))
     
-    if save!='':
-        mpl.use('Agg')
-    else:
+    show = interactive(save)
+    if save=='' and not show: ### Nothing is calculated when the figure would be neither saved nor shown.
+        return
+    
+    if show:
         #['GTK3Agg', 'GTK3Cairo', 'MacOSX', 'nbAgg', 'Qt4Agg', 'Qt4Cairo', 'Qt5Agg', 'Qt5Cairo', 'TkAgg', 'TkCairo', 'WebAgg', 'WX', 'WXAgg', 'WXCairo', 'agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template']
         mpl.use('Qt5Agg')
+    else:
+        mpl.use('Agg') ### No GUI toolkit is loaded.
     
     
     num_of_bins = {info['chr_id']: chr_length(info['chr_id'])//bin_size}
@@ -397,26 +589,23 @@ def single_plot(likelihoods,info,**kwargs):
               frozenset(('disomy','monosomy')):(104/255,162/255,183/255),
               frozenset(('BPH','SPH')):(104/255,162/255,104/255)}
     
-    LLRs = {(i,j): 
-            {window: tuple(LLR(attrgetter(i)(l), attrgetter(j)(l)) for l in likelihoods_in_window)
-                       for window,likelihoods_in_window in likelihoods.items()} 
-                                                        for i,j in pairs}
+    LLRs = {(i,j): LLRs_per_window(likelihoods, (i,j)) for i,j in pairs}
+    bins = bin_genomic_windows([*likelihoods], info['chr_id'], num_of_bins[info['chr_id']]) ### The genomic windows are binned once for all the pairs of scenarios.
         
     fig,(ax1)=plt.subplots(1,1, figsize=(16 * scale, 9 * scale))
     fig.subplots_adjust(left=0, bottom=0, right=1, top=1, wspace=None, hspace=None)
     H = {}
+    B = np.array([*bins], dtype=np.float64) ### The boundaries of the bins, which are shared by all the pairs of scenarios.
+    T = B.mean(axis=1)
+    P = (B[:,1]-B[:,0])/2
+    steps_x = np.concatenate((B[:1,0], np.repeat(B[:-1,1], 2), B[-1:,1]))
     for p,LLRs_per_genomic_window in LLRs.items():
-        X,Y,E = binning(LLRs_per_genomic_window,info,num_of_bins[info['chr_id']])
-        Y = [(y if y else 0) for y in Y]
-        E = [(z_score*e if e else 0) for e in E]        
-        T = [(x[1]+x[0])/2 for x in X]            
-        
-        ###ax1.plot([X[0][0]]+[i[1] for i in X[:-1] for j in (1,2)]+[X[-1][1]],[i for i in Y for j in (1,2)], label=f'{p[0]:s} vs. {p[1]:s}',color=colors[p],linewidth=2)
+        X,Y,E = binning(LLRs_per_genomic_window,info,num_of_bins[info['chr_id']],bins)
+        Y = np.nan_to_num(np.array(Y, dtype=np.float64)) ### Empty bins are given as None, which is converted to NaN and then to zero.
+        E = z_score * np.nan_to_num(np.array(E, dtype=np.float64))
         
-        steps_x = [X[0][0]]+[i[1] for i in X[:-1] for j in (1,2)]+[X[-1][1]]
-        steps_y = [i for i in Y for j in (1,2)]
+        steps_y = np.repeat(Y, 2)
         H[p] = ax1.plot(steps_x, steps_y, label=f'{capitalize(p[0]):s} vs. {capitalize(p[1]):s}' ,color=colors[frozenset(p)], linewidth=2*scale, zorder=10, scalex=True, scaley=True, alpha=0.8)
-        P = [(x[1]-x[0])/2 for x in X]                
         ax1.errorbar(T, Y, xerr = P, color=colors[frozenset(p)],marker=None, ls='none',alpha=1, zorder=13, linewidth=3*scale) 
         
         
@@ -478,9 +667,10 @@ def wrap_panel_plot_for_single_indv(identifier, **kwargs):
     """ Wraps the function panel_plot to show all the chromosomes from a single individual. """
     
     DATA = {}
-    for i in [*range(1,23)]+['X']:
-        llr_filename = kwargs.get('work_dir','.').rstrip('/') + '/' + f'{identifier:s}.chr{str(i):s}.LLR.p.bz2'
-        likelihoods,info = load_likelihoods(llr_filename) 
+    llr_filenames = [kwargs.get('work_dir','.').rstrip('/') + '/' + f'{identifier:s}.chr{str(i):s}.LLR.p.bz2' for i in [*range(1,23)]+['X']]
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count())) as executor: ### The files are decompressed in parallel, since bz2 releases the GIL.
+        loaded = [*executor.map(load_likelihoods, llr_filenames)]
+    for llr_filename,(likelihoods,info) in zip(llr_filenames,loaded):
         DATA[f"{info['chr_id'].replace('chr', 'Chromosome '):s}, {info['depth']:.2f}x"] = (likelihoods, info)
         show_info(llr_filename, info, kwargs.get('pairs', (('BPH','SPH'),)))
         kwargs['title'] = identifier
@@ -492,14 +682,17 @@ def wrap_panel_plot_many_cases(filenames, **kwargs):
     """ Wraps the function panel_plot to show a panel with many cases. """
     
     DATA = {}
-    for llr_filename in filenames:
-        likelihoods,info = load_likelihoods(llr_filename)
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count())) as executor: ### The files are decompressed in parallel, since bz2 releases the GIL.
+        loaded = [*executor.map(load_likelihoods, filenames)]
+    for llr_filename,(likelihoods,info) in zip(filenames,loaded):
         if llr_filename[-6:]=='.LLR.p':
             identifer = llr_filename[:-6].rsplit('/',1).pop()
         elif llr_filename[-10:]=='.LLR.p.bz2':
             identifer = llr_filename[:-10].rsplit('/',1).pop()
         elif llr_filename[-9:]=='.LLR.p.gz':
             identifer = llr_filename[:9].rsplit('/',1).pop()
+        elif llr_filename[-8:]=='.LLR.npz':
+            identifer = llr_filename[:-8].rsplit('/',1).pop()
         else:
             identifer = llr_filename.rsplit('/',1).pop()
         DATA[identifer]=(likelihoods, info)
@@ -22,7 +22,7 @@ import pickle, os, sys, bz2, collections, gzip, platform
 
 from functools import reduce
 from operator import and_, itemgetter
-from itertools import combinations
+from itertools import combinations, compress
 
 leg_tuple = collections.namedtuple('leg_tuple', ('chr_id', 'pos', 'ref', 'alt')) #Encodes the rows of the legend table
 obs_tuple = collections.namedtuple('obs_tuple', ('pos', 'read_id', 'base')) #Encodes the rows of the observations table
@@ -88,7 +88,9 @@ class recent_admixture:
 
         hap_dict = dict()
         mismatches = 0
-        combined = {pos: (ref,alt,hap) for (chr_id,pos,ref,alt),hap in zip(leg_tab, hap_tab)}
+        observed = {pos for (pos, read_id, base) in obs_tab}
+        rows = compress(zip(leg_tab, hap_tab), map(observed.__contains__, map(itemgetter(1), leg_tab)))
+        combined = {pos: (ref,alt,hap) for (chr_id,pos,ref,alt),hap in rows}
         missing = 3*(None,)
 
         b = (1 << number_of_haplotypes) - 1 #### equivalent to int('1'*number_of_haplotypes,2)
@@ -160,9 +162,10 @@ class recent_admixture:
         for C in combinations(hap, 3):
             result[C[0]|C[1]|C[2]] = popcount(hap[C[0]]&hap[C[1]]&hap[C[2]])
 
+        keys, values = tuple(hap), tuple(hap.values()) ### Combinations of the keys and of the values are drawn in the same order.
         for r in range(4,len(alleles)):
-            for C in combinations(hap, r):
-                result[sum(C)] = popcount(reduce(and_,itemgetter(*C)(hap)))
+            for C, A in zip(combinations(keys, r), combinations(values, r)):
+                result[sum(C)] = popcount(reduce(and_,A))
 
         if len(alleles)>=4:
             result[sum(hap.keys())] = popcount(reduce(and_,hap.values()))